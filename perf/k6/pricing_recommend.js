@@ -0,0 +1,34 @@
+import http from 'k6/http';
+import { check } from 'k6';
+
+const baseUrl = __ENV.PERF_BASE_URL || 'http://localhost:8102';
+
+const categories = ['camera', 'lens', 'lighting', 'audio', 'grip', 'drone'];
+const seasonalities = ['low', 'normal', 'high', 'peak'];
+
+export const options = {
+  vus: Number(__ENV.PERF_VUS || 50),
+  duration: __ENV.PERF_DURATION || '60s',
+  thresholds: {
+    http_req_failed: ['rate<0.01'],
+    http_req_duration: ['p(95)<50']
+  }
+};
+
+export default function () {
+  const payload = JSON.stringify({
+    organizationId: 'org_perf',
+    category: categories[__ITER % categories.length],
+    seasonality: seasonalities[__VU % seasonalities.length],
+    baseDailyRateCents: 5000 + (__ITER % 20) * 500,
+    utilizationHistory: [0.35, 0.5, 0.62, 0.71]
+  });
+
+  const res = http.post(`${baseUrl}/recommend`, payload, {
+    headers: { 'Content-Type': 'application/json' }
+  });
+  check(res, {
+    'recommend 200': (r) => r.status === 200,
+    'recommend has rate': (r) => r.status === 200 && r.json('suggestedDailyRateCents') > 0
+  });
+}
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Protocol
 from urllib import request
 
 
+class CallbackClientPort(Protocol):
+    def post_status(self, callback_path: str, payload: dict[str, Any]) -> None: ...
+
+
 @dataclass(frozen=True)
-class CallbackClient:
+class CallbackClient(CallbackClientPort):
     base_url: str
     callback_token: str = ""
 
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Protocol, TypeVar
+from urllib import parse, request
+from urllib.error import HTTPError, URLError
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ArtifactUploadError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class UploadedPart:
+    part_number: int
+    etag: str
+    size: int
+    md5_digest: bytes
+
+
+@dataclass(frozen=True)
+class UploadResult:
+    key: str
+    url: str
+    etag: str
+    size: int
+    parts: int
+
+
+class ObjectStorePort(Protocol):
+    def object_url(self, key: str) -> str: ...
+
+    def put_object(self, key: str, data: bytes) -> str: ...
+
+    def create_multipart_upload(self, key: str) -> str: ...
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str: ...
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: list[UploadedPart]
+    ) -> str: ...
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None: ...
+
+
+def _md5(data: bytes) -> bytes:
+    return hashlib.md5(data, usedforsecurity=False).digest()
+
+
+def _strip_etag(etag: str | None) -> str:
+    return (etag or "").strip().strip('"')
+
+
+def _find_text(xml_body: bytes, tag: str) -> str:
+    root = ElementTree.fromstring(xml_body)
+    for element in root.iter():
+        if element.tag == tag or element.tag.endswith(f"}}{tag}"):
+            return element.text or ""
+    raise ArtifactUploadError(f"Object store response is missing {tag}")
+
+
+class S3CompatibleClient(ObjectStorePort):
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        region: str = "us-east-1",
+        access_key_id: str = "",
+        secret_access_key: str = "",
+        timeout_seconds: float = 30.0,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.timeout_seconds = timeout_seconds
+
+    def object_url(self, key: str) -> str:
+        return f"{self.endpoint_url}/{self.bucket}/{parse.quote(key)}"
+
+    def _sign(
+        self, method: str, url: parse.SplitResult, headers: dict[str, str], payload_hash: str
+    ) -> None:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope_date = now.strftime("%Y%m%d")
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+        if not self.access_key_id:
+            return
+
+        signed = {name.lower(): value.strip() for name, value in headers.items()}
+        signed["host"] = url.netloc
+        signed_names = ";".join(sorted(signed))
+        query = "&".join(
+            f"{parse.quote(name, safe='-_.~')}={parse.quote(value, safe='-_.~')}"
+            for name, value in sorted(parse.parse_qsl(url.query, keep_blank_values=True))
+        )
+        canonical_request = "\n".join(
+            [
+                method,
+                url.path or "/",
+                query,
+                "".join(f"{name}:{signed[name]}\n" for name in sorted(signed)),
+                signed_names,
+                payload_hash,
+            ]
+        )
+        scope = f"{scope_date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+            ]
+        )
+
+        key = f"AWS4{self.secret_access_key}".encode("utf-8")
+        for part in (scope_date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key_id}/{scope}, "
+            f"SignedHeaders={signed_names}, Signature={signature}"
+        )
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        query: dict[str, str] | None = None,
+        body: bytes = b"",
+        content_md5: bytes | None = None,
+    ) -> tuple[bytes, dict[str, str]]:
+        url = self.object_url(key)
+        if query:
+            url = f"{url}?{parse.urlencode(query)}"
+
+        headers: dict[str, str] = {"Content-Length": str(len(body))}
+        if content_md5 is not None:
+            headers["Content-MD5"] = base64.b64encode(content_md5).decode("ascii")
+        self._sign(method, parse.urlsplit(url), headers, hashlib.sha256(body).hexdigest())
+
+        req = request.Request(url, data=body or None, headers=headers, method=method)
+        with request.urlopen(req, timeout=self.timeout_seconds) as response:  # noqa: S310
+            return response.read(), dict(response.headers.items())
+
+    def put_object(self, key: str, data: bytes) -> str:
+        _, headers = self._request("PUT", key, body=data, content_md5=_md5(data))
+        return _strip_etag(headers.get("ETag"))
+
+    def create_multipart_upload(self, key: str) -> str:
+        body, _ = self._request("POST", key, query={"uploads": ""})
+        return _find_text(body, "UploadId")
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        _, headers = self._request(
+            "PUT",
+            key,
+            query={"partNumber": str(part_number), "uploadId": upload_id},
+            body=data,
+            content_md5=_md5(data),
+        )
+        return _strip_etag(headers.get("ETag"))
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: list[UploadedPart]) -> str:
+        manifest = "".join(
+            f'<Part><PartNumber>{part.part_number}</PartNumber><ETag>"{part.etag}"</ETag></Part>'
+            for part in parts
+        )
+        body, _ = self._request(
+            "POST",
+            key,
+            query={"uploadId": upload_id},
+            body=f"<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>".encode("utf-8"),
+        )
+        return _strip_etag(_find_text(body, "ETag"))
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self._request("DELETE", key, query={"uploadId": upload_id})
+
+
+def is_retryable_upload_error(error: Exception) -> bool:
+    if isinstance(error, HTTPError):
+        # 400 covers BadDigest, i.e. a part corrupted in transit.
+        return error.code >= 500 or error.code in (400, 408, 429)
+    return isinstance(error, (URLError, OSError))
+
+
+def _check_etag(description: str, etag: str, expected: str) -> None:
+    # Content-MD5 already makes the store reject corrupted bodies. ETags only
+    # equal the MD5 for unencrypted objects (not SSE-KMS/SSE-C, not every
+    # S3-compatible store), so a mismatch is reported rather than failed.
+    if etag != expected:
+        logger.warning("ETag for %s is %s, expected %s", description, etag, expected)
+
+
+class MultipartUploader:
+    def __init__(
+        self,
+        store: ObjectStorePort,
+        part_size_bytes: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        max_buffered_parts: int | None = None,
+        max_attempts: int = 4,
+        retry_base_seconds: float = 0.25,
+    ):
+        self.store = store
+        self.part_size_bytes = part_size_bytes
+        self.max_concurrency = max_concurrency
+        self.max_buffered_parts = max_buffered_parts or max_concurrency * 2
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+
+    def _with_retries(self, description: str, operation: Callable[[], T]) -> T:
+        # Every store call goes through here, so callers only ever see ArtifactUploadError.
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return operation()
+            except Exception as error:  # noqa: BLE001 - classified just below
+                if attempt == self.max_attempts or not is_retryable_upload_error(error):
+                    raise ArtifactUploadError(
+                        f"Object store request for {description} failed after {attempt} "
+                        f"attempts: {error}"
+                    ) from error
+                logger.warning("Retrying %s: %s", description, error)
+                time.sleep(self.retry_base_seconds * (2 ** (attempt - 1)))
+        raise ArtifactUploadError(f"Object store request for {description} was not sent")
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> UploadedPart:
+        digest = _md5(data)
+        description = f"part {part_number} of {key}"
+        etag = self._with_retries(
+            description, lambda: self.store.upload_part(key, upload_id, part_number, data)
+        )
+        _check_etag(description, etag, digest.hex())
+        return UploadedPart(part_number, etag, len(data), digest)
+
+    def put(self, key: str, data: bytes) -> UploadResult:
+        etag = self._with_retries(f"single PUT of {key}", lambda: self.store.put_object(key, data))
+        _check_etag(key, etag, _md5(data).hex())
+        return UploadResult(key, self.store.object_url(key), etag, len(data), 1)
+
+    def upload_stream(self, key: str, chunks: Iterable[bytes]) -> UploadResult:
+        iterator = iter(chunks)
+        buffer = bytearray()
+        for chunk in iterator:
+            buffer += chunk
+            if len(buffer) > self.part_size_bytes:
+                break
+        else:
+            # Everything fit in one part: a single PUT is cheaper than a multipart round trip.
+            return self.put(key, bytes(buffer))
+
+        upload_id = self._with_retries(
+            f"creating multipart upload of {key}", lambda: self.store.create_multipart_upload(key)
+        )
+        slots = threading.BoundedSemaphore(self.max_buffered_parts)
+        futures: list[Future[UploadedPart]] = []
+
+        def release_slot(_future: Future[UploadedPart]) -> None:
+            slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+
+                def submit(data: bytes) -> None:
+                    # Blocks the producer (the encoder) once too many parts are buffered.
+                    slots.acquire()
+                    if any(future.done() and future.exception() for future in futures):
+                        slots.release()
+                        raise ArtifactUploadError(f"Aborting upload of {key} after part failure")
+                    future = executor.submit(
+                        self._upload_part, key, upload_id, len(futures) + 1, data
+                    )
+                    future.add_done_callback(release_slot)
+                    futures.append(future)
+
+                while True:
+                    while len(buffer) >= self.part_size_bytes:
+                        submit(bytes(buffer[: self.part_size_bytes]))
+                        del buffer[: self.part_size_bytes]
+                    next_chunk = next(iterator, None)
+                    if next_chunk is None:
+                        break
+                    buffer += next_chunk
+                if buffer or not futures:
+                    submit(bytes(buffer))
+
+                parts = [future.result() for future in futures]
+
+            etag = self._with_retries(
+                f"completing multipart upload of {key}",
+                lambda: self.store.complete_multipart_upload(key, upload_id, parts),
+            )
+            expected = _md5(b"".join(part.md5_digest for part in parts)).hex()
+            _check_etag(key, etag, f"{expected}-{len(parts)}")
+        except BaseException:
+            try:
+                self.store.abort_multipart_upload(key, upload_id)
+            except Exception:  # noqa: BLE001 - keep the original failure
+                logger.exception("Failed to abort multipart upload %s for %s", upload_id, key)
+            raise
+
+        size = sum(part.size for part in parts)
+        return UploadResult(key, self.store.object_url(key), etag, size, len(parts))
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from urllib.error import HTTPError
+
+from .api_callback import CallbackClientPort
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint"
+DEAD_LETTER_FILE = "dead-letter.log"
+
+
+@dataclass(frozen=True)
+class OutboxRecord:
+    seq: int
+    callback_path: str
+    payload: dict[str, Any]
+    enqueued_at: float
+
+    @property
+    def job_id(self) -> str:
+        return str(self.payload.get("jobId", ""))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "callbackPath": self.callback_path,
+            "payload": self.payload,
+            "enqueuedAt": self.enqueued_at,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @staticmethod
+    def from_json(line: str) -> "OutboxRecord":
+        raw = json.loads(line)
+        return OutboxRecord(
+            seq=int(raw["seq"]),
+            callback_path=str(raw["callbackPath"]),
+            payload=dict(raw["payload"]),
+            enqueued_at=float(raw["enqueuedAt"]),
+        )
+
+
+def compact_records(records: list[OutboxRecord]) -> list[OutboxRecord]:
+    # Only the newest status per job matters to the API; older ones are superseded.
+    latest: dict[str, OutboxRecord] = {}
+    anonymous: list[OutboxRecord] = []
+    for record in records:
+        if not record.job_id:
+            anonymous.append(record)
+            continue
+        current = latest.get(record.job_id)
+        if current is None or record.seq > current.seq:
+            latest[record.job_id] = record
+    return sorted([*latest.values(), *anonymous], key=lambda record: record.seq)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    if isinstance(error, http.client.InvalidURL):
+        # A malformed callbackPath fails the same way on every attempt.
+        return False
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+class CallbackOutbox:
+    def __init__(
+        self,
+        directory: str | Path,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        fsync_batch_size: int = 32,
+        fsync_interval_seconds: float = 0.05,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval_seconds = fsync_interval_seconds
+
+        self._lock = threading.Lock()
+        self._pending: dict[int, OutboxRecord] = {}
+        self._checkpoint = self._read_checkpoint()
+        self._next_seq = self._checkpoint + 1
+        self._recover()
+
+        self._segment_path = self._segment_for(self._next_seq)
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _segment_for(self, first_seq: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    def _read_checkpoint(self) -> int:
+        try:
+            return int((self.directory / CHECKPOINT_FILE).read_text(encoding="ascii").strip())
+        except (OSError, ValueError):
+            return 0
+
+    def _recover(self) -> None:
+        resolved: set[int] = set()
+        for segment in self._segments():
+            with open(segment, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        raw = json.loads(line)
+                        if "resolved" in raw:
+                            resolved.update(int(seq) for seq in raw["resolved"])
+                            continue
+                        record = OutboxRecord.from_json(line)
+                    except (ValueError, KeyError, TypeError):
+                        # A torn tail from a crash mid-append; everything before it is intact.
+                        continue
+                    self._next_seq = max(self._next_seq, record.seq + 1)
+                    if record.seq > self._checkpoint:
+                        self._pending[record.seq] = record
+        for seq in resolved:
+            self._pending.pop(seq, None)
+
+    def append(self, callback_path: str, payload: dict[str, Any]) -> OutboxRecord:
+        with self._lock:
+            record = OutboxRecord(
+                seq=self._next_seq,
+                callback_path=callback_path,
+                payload=payload,
+                enqueued_at=time.time(),
+            )
+            self._next_seq += 1
+            if self._segment.tell() >= self.segment_max_bytes:
+                self._roll_segment(record.seq)
+            self._write_locked(record.to_json())
+            self._pending[record.seq] = record
+            return record
+
+    def _write_locked(self, line: str) -> None:
+        self._segment.write(line + "\n")
+        self._segment.flush()
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.fsync_batch_size
+            or time.monotonic() - self._last_sync >= self.fsync_interval_seconds
+        ):
+            self._sync_locked()
+
+    def _roll_segment(self, first_seq: int) -> None:
+        self._sync_locked()
+        self._segment.close()
+        self._segment_path = self._segment_for(first_seq)
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def _sync_locked(self) -> None:
+        if self._unsynced:
+            os.fsync(self._segment.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync_locked()
+
+    def pending(self) -> list[OutboxRecord]:
+        with self._lock:
+            return sorted(self._pending.values(), key=lambda record: record.seq)
+
+    def resolve(self, records: list[OutboxRecord]) -> None:
+        with self._lock:
+            resolved = [
+                record.seq for record in records if self._pending.pop(record.seq, None) is not None
+            ]
+            # The checkpoint only covers the unbroken prefix of resolved records;
+            # anything resolved past a still-pending record gets a tombstone so a
+            # restart does not deliver it again.
+            checkpoint = min(self._pending, default=self._next_seq) - 1
+            tombstones = sorted(seq for seq in resolved if seq > checkpoint)
+            if tombstones:
+                self._write_locked(json.dumps({"resolved": tombstones}))
+            if checkpoint <= self._checkpoint:
+                return
+            self._checkpoint = checkpoint
+            self._write_checkpoint_locked()
+            self._delete_resolved_segments_locked()
+
+    def dead_letter(self, record: OutboxRecord, error: Exception, attempts: int) -> None:
+        entry = {**record.to_dict(), "error": str(error), "attempts": attempts}
+        with self._lock:
+            with open(self.directory / DEAD_LETTER_FILE, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(entry) + "\n")
+
+    def _write_checkpoint_locked(self) -> None:
+        temporary = self.directory / f"{CHECKPOINT_FILE}.tmp"
+        with open(temporary, "w", encoding="ascii") as handle:
+            handle.write(str(self._checkpoint))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.directory / CHECKPOINT_FILE)
+
+    def _delete_resolved_segments_locked(self) -> None:
+        segments = self._segments()
+        for segment, following in zip(segments, segments[1:]):
+            if segment == self._segment_path:
+                continue
+            last_seq = int(following.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]) - 1
+            if last_seq <= self._checkpoint:
+                segment.unlink(missing_ok=True)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            oldest = min((record.enqueued_at for record in self._pending.values()), default=None)
+            return {
+                "depth": len(self._pending),
+                "oldestAgeSeconds": round(time.time() - oldest, 3) if oldest else 0.0,
+                "segments": len(self._segments()),
+                "checkpoint": self._checkpoint,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            self._segment.close()
+
+
+class OutboxCallbackClient(CallbackClientPort):
+    def __init__(
+        self,
+        outbox: CallbackOutbox,
+        delivery_client: CallbackClientPort,
+        replay_concurrency: int = 8,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 60.0,
+        max_attempts: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.outbox = outbox
+        self.delivery_client = delivery_client
+        self.replay_concurrency = replay_concurrency
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.clock = clock
+        self.delivered_total = 0
+        self.dropped_total = 0
+        self.failed_attempts_total = 0
+        # Backoff is tracked per record, so one failing callback does not hold
+        # back the ones queued after it.
+        self._attempts: dict[int, int] = {}
+        self._retry_at: dict[int, float] = {}
+        self._drain_failures = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def post_status(self, callback_path: str, payload: dict[str, Any]) -> None:
+        self.outbox.append(callback_path, payload)
+        self._wakeup.set()
+
+    def _deliver(self, record: OutboxRecord) -> Exception | None:
+        try:
+            self.delivery_client.post_status(record.callback_path, record.payload)
+        except Exception as error:  # noqa: BLE001 - every failure is classified below
+            return error
+        return None
+
+    def drain_once(self) -> int:
+        self.outbox.sync()
+        pending = self.outbox.pending()
+        if not pending:
+            return 0
+
+        now = self.clock()
+        batch = compact_records(pending)
+        batch_seqs = {record.seq for record in batch}
+        # Superseded records never need delivery, whatever happens to the newer one.
+        resolved = [record for record in pending if record.seq not in batch_seqs]
+        due = [record for record in batch if self._retry_at.get(record.seq, now) <= now]
+        with ThreadPoolExecutor(max_workers=max(1, self.replay_concurrency)) as executor:
+            outcomes = list(zip(due, executor.map(self._deliver, due)))
+
+        settled = 0
+        for record, error in outcomes:
+            if error is None:
+                self.delivered_total += 1
+                resolved.append(record)
+                settled += 1
+                continue
+            attempts = self._attempts.get(record.seq, 0) + 1
+            if is_retryable(error) and attempts < self.max_attempts:
+                self.failed_attempts_total += 1
+                self._attempts[record.seq] = attempts
+                self._retry_at[record.seq] = now + self.next_retry_delay(attempts)
+                continue
+            logger.error(
+                "Dropping callback for job %s after %s attempts: %s", record.job_id, attempts, error
+            )
+            self.outbox.dead_letter(record, error, attempts)
+            self.dropped_total += 1
+            resolved.append(record)
+            settled += 1
+
+        self.outbox.resolve(resolved)
+        for record in resolved:
+            self._attempts.pop(record.seq, None)
+            self._retry_at.pop(record.seq, None)
+        return settled
+
+    def next_retry_delay(self, attempts: int) -> float:
+        exponent = min(attempts - 1, 16)
+        return min(self.retry_max_seconds, self.retry_base_seconds * 2.0**exponent)
+
+    def _next_drain_delay(self) -> float:
+        if self._drain_failures:
+            return self.next_retry_delay(self._drain_failures)
+        if not self._retry_at:
+            return self.retry_max_seconds
+        earliest = min(self._retry_at.values())
+        return min(self.retry_max_seconds, max(0.0, earliest - self.clock()))
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            # New callbacks wake the drain at once; records that are backing off
+            # are simply skipped until they are due.
+            self._wakeup.wait(self._next_drain_delay())
+            self._wakeup.clear()
+            try:
+                self.drain_once()
+                self._drain_failures = 0
+            except Exception:  # noqa: BLE001 - keep draining after unexpected errors
+                logger.exception("Callback outbox drain failed")
+                self._drain_failures += 1
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="callback-outbox", daemon=True)
+        self._thread.start()
+        self._wakeup.set()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.outbox.close()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            **self.outbox.metrics(),
+            "deliveredTotal": self.delivered_total,
+            "droppedTotal": self.dropped_total,
+            "failedAttemptsTotal": self.failed_attempts_total,
+        }
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+JOB_CLASS_SHORT = "short"
+JOB_CLASS_STANDARD = "standard"
+JOB_CLASS_HEAVY = "heavy"
+
+# Relative encode cost of decoding each source codec and re-encoding it to the
+# h264 proxy, normalised to h264 input.
+CODEC_CPU_FACTORS: dict[str, float] = {
+    "h264": 1.0,
+    "mpeg2video": 0.7,
+    "mjpeg": 0.8,
+    "prores": 0.9,
+    "dnxhd": 0.9,
+    "hevc": 1.8,
+    "h265": 1.8,
+    "vp9": 2.2,
+    "av1": 3.5,
+}
+DEFAULT_CODEC_CPU_FACTOR = 1.5
+
+
+@dataclass(frozen=True)
+class JobCostEstimate:
+    codec: str
+    duration_seconds: float
+    megapixels: float
+    cpu_seconds: float
+    memory_mb: float
+    cores: int
+    job_class: str
+
+    @property
+    def runtime_seconds(self) -> float:
+        return self.cpu_seconds / self.cores
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "codec": self.codec,
+            "durationSeconds": self.duration_seconds,
+            "megapixels": round(self.megapixels, 3),
+            "cpuSeconds": round(self.cpu_seconds, 3),
+            "memoryMb": round(self.memory_mb, 1),
+            "cores": self.cores,
+            "jobClass": self.job_class,
+        }
+
+
+def _number(metadata: dict[str, Any], key: str) -> float:
+    try:
+        value = float(metadata.get(key) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if math.isfinite(value) and value > 0 else 0.0
+
+
+class TranscodeCostModel:
+    def __init__(
+        self,
+        cpu_seconds_per_megapixel_second: float = 0.25,
+        fixed_cpu_seconds: float = 2.0,
+        base_memory_mb: float = 160.0,
+        memory_mb_per_megapixel: float = 48.0,
+        megapixels_per_core: float = 2.0,
+        max_cores_per_job: int = 4,
+        short_job_cpu_seconds: float = 30.0,
+        heavy_job_cpu_seconds: float = 600.0,
+        calibration_weight: float = 0.2,
+    ):
+        self.cpu_seconds_per_megapixel_second = cpu_seconds_per_megapixel_second
+        self.fixed_cpu_seconds = fixed_cpu_seconds
+        self.base_memory_mb = base_memory_mb
+        self.memory_mb_per_megapixel = memory_mb_per_megapixel
+        self.megapixels_per_core = megapixels_per_core
+        self.max_cores_per_job = max(1, max_cores_per_job)
+        self.short_job_cpu_seconds = short_job_cpu_seconds
+        self.heavy_job_cpu_seconds = heavy_job_cpu_seconds
+        self.calibration_weight = calibration_weight
+        self._lock = threading.Lock()
+        self._cpu_corrections: dict[str, float] = {}
+        self._memory_corrections: dict[str, float] = {}
+        self._observations: dict[str, int] = {}
+
+    def _baseline(self, metadata: dict[str, Any]) -> tuple[str, float, float, float, float]:
+        codec = str(metadata.get("codec") or "unknown").lower()
+        duration = _number(metadata, "durationSeconds")
+        megapixels = _number(metadata, "width") * _number(metadata, "height") / 1_000_000
+        factor = CODEC_CPU_FACTORS.get(codec, DEFAULT_CODEC_CPU_FACTOR)
+        cpu_seconds = (
+            self.fixed_cpu_seconds
+            + duration * megapixels * self.cpu_seconds_per_megapixel_second * factor
+        )
+        # Decoder and encoder frame buffers scale with resolution, not duration.
+        memory_mb = self.base_memory_mb + megapixels * self.memory_mb_per_megapixel * factor
+        return codec, duration, megapixels, cpu_seconds, memory_mb
+
+    def classify(self, cpu_seconds: float) -> str:
+        if cpu_seconds <= self.short_job_cpu_seconds:
+            return JOB_CLASS_SHORT
+        if cpu_seconds >= self.heavy_job_cpu_seconds:
+            return JOB_CLASS_HEAVY
+        return JOB_CLASS_STANDARD
+
+    def estimate(self, metadata: dict[str, Any]) -> JobCostEstimate:
+        codec, duration, megapixels, cpu_seconds, memory_mb = self._baseline(metadata)
+        with self._lock:
+            cpu_seconds *= self._cpu_corrections.get(codec, 1.0)
+            memory_mb *= self._memory_corrections.get(codec, 1.0)
+        cores = max(1, math.ceil(megapixels / self.megapixels_per_core))
+        return JobCostEstimate(
+            codec=codec,
+            duration_seconds=duration,
+            megapixels=megapixels,
+            cpu_seconds=cpu_seconds,
+            memory_mb=memory_mb,
+            cores=min(self.max_cores_per_job, cores),
+            job_class=self.classify(cpu_seconds),
+        )
+
+    def observe(
+        self,
+        metadata: dict[str, Any],
+        actual_cpu_seconds: float,
+        actual_memory_mb: float | None = None,
+    ) -> None:
+        # Corrections are per codec: an exponentially weighted ratio of observed
+        # to baseline cost, so a few outliers do not swing later estimates.
+        codec, _, _, baseline_cpu, baseline_memory = self._baseline(metadata)
+        cpu_ratio = actual_cpu_seconds / max(baseline_cpu, 1e-6)
+        with self._lock:
+            self._cpu_corrections[codec] = self._blend(self._cpu_corrections.get(codec), cpu_ratio)
+            if actual_memory_mb is not None:
+                memory_ratio = actual_memory_mb / max(baseline_memory, 1e-6)
+                self._memory_corrections[codec] = self._blend(
+                    self._memory_corrections.get(codec), memory_ratio
+                )
+            self._observations[codec] = self._observations.get(codec, 0) + 1
+
+    def _blend(self, current: float | None, ratio: float) -> float:
+        ratio = min(max(ratio, 0.05), 20.0)
+        if current is None:
+            return ratio
+        return current + self.calibration_weight * (ratio - current)
+
+    def calibration(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                codec: {
+                    "cpuCorrection": round(self._cpu_corrections.get(codec, 1.0), 4),
+                    "memoryCorrection": round(self._memory_corrections.get(codec, 1.0), 4),
+                    "observations": count,
+                }
+                for codec, count in sorted(self._observations.items())
+            }
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any, Protocol
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-act scripts so a holder never touches a lock that expired and
+# was taken over by someone else.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_REFRESH_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def work_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStorePort(Protocol):
+    def get(self, key: str) -> dict[str, Any] | None: ...
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None: ...
+
+    def acquire(self, key: str, ttl_seconds: float) -> str | None: ...
+
+    def refresh(self, key: str, token: str, ttl_seconds: float) -> bool: ...
+
+    def release(self, key: str, token: str) -> None: ...
+
+    def wait(self, key: str, timeout: float) -> None: ...
+
+
+class InMemoryIdempotencyStore(IdempotencyStorePort):
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._values: dict[str, tuple[float, dict[str, Any]]] = {}
+        # Expiry order of stored values, so keys that are never read again are still evicted.
+        self._expiries: list[tuple[float, str]] = []
+        self._locks: dict[str, tuple[str, float]] = {}
+        self._condition = threading.Condition()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._condition:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._values[key]
+                return None
+            return value
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None:
+        with self._condition:
+            now = self._clock()
+            self._evict_expired_locked(now)
+            expires_at = now + ttl_seconds
+            self._values[key] = (expires_at, value)
+            heapq.heappush(self._expiries, (expires_at, key))
+            self._condition.notify_all()
+
+    def _evict_expired_locked(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiries)
+            entry = self._values.get(key)
+            # A key written again since has a later expiry of its own.
+            if entry is not None and entry[0] == expires_at:
+                del self._values[key]
+
+    def acquire(self, key: str, ttl_seconds: float) -> str | None:
+        with self._condition:
+            now = self._clock()
+            held = self._locks.get(key)
+            if held is not None and held[1] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[key] = (token, now + ttl_seconds)
+            return token
+
+    def refresh(self, key: str, token: str, ttl_seconds: float) -> bool:
+        with self._condition:
+            held = self._locks.get(key)
+            now = self._clock()
+            if held is None or held[0] != token or held[1] <= now:
+                return False
+            self._locks[key] = (token, now + ttl_seconds)
+            return True
+
+    def release(self, key: str, token: str) -> None:
+        with self._condition:
+            held = self._locks.get(key)
+            if held is not None and held[0] == token:
+                del self._locks[key]
+            self._condition.notify_all()
+
+    def wait(self, key: str, timeout: float) -> None:
+        _ = key
+        with self._condition:
+            self._condition.wait(timeout)
+
+
+class RedisIdempotencyStore(IdempotencyStorePort):
+    def __init__(
+        self,
+        redis_url: str,
+        namespace: str,
+        poll_interval_seconds: float = 0.1,
+        client: Any | None = None,
+    ):
+        if client is None:
+            try:
+                import redis  # type: ignore[import-not-found]
+            except ImportError as error:  # pragma: no cover
+                raise RuntimeError("redis package is required for RedisIdempotencyStore") from error
+            client = redis.from_url(redis_url)
+
+        self._redis = client
+        self._namespace = namespace
+        self._poll_interval_seconds = poll_interval_seconds
+
+    def _key(self, key: str) -> str:
+        return f"{self._namespace}:{key}"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        raw = self._redis.get(self._key(key))
+        if raw is None:
+            return None
+
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+
+        value = json.loads(raw)
+        if isinstance(value, dict):
+            return value
+        return None
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None:
+        self._redis.set(self._key(key), json.dumps(value), px=max(1, int(ttl_seconds * 1000)))
+
+    def acquire(self, key: str, ttl_seconds: float) -> str | None:
+        token = uuid.uuid4().hex
+        acquired = self._redis.set(
+            self._key(f"lock:{key}"), token, nx=True, px=max(1, int(ttl_seconds * 1000))
+        )
+        return token if acquired else None
+
+    def refresh(self, key: str, token: str, ttl_seconds: float) -> bool:
+        refreshed = self._redis.eval(
+            _REFRESH_LOCK_SCRIPT,
+            1,
+            self._key(f"lock:{key}"),
+            token,
+            max(1, int(ttl_seconds * 1000)),
+        )
+        return bool(refreshed)
+
+    def release(self, key: str, token: str) -> None:
+        self._redis.eval(_RELEASE_LOCK_SCRIPT, 1, self._key(f"lock:{key}"), token)
+
+    def wait(self, key: str, timeout: float) -> None:
+        _ = key
+        time.sleep(min(timeout, self._poll_interval_seconds))
+
+
+class JobDeduplicator:
+    def __init__(
+        self,
+        store: IdempotencyStorePort,
+        result_ttl_seconds: float = 86400.0,
+        inflight_ttl_seconds: float = 60.0,
+        fanout_ttl_seconds: float = 60.0,
+        wait_interval_seconds: float = 0.5,
+        max_wait_seconds: float = 4 * 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.store = store
+        self.result_ttl_seconds = result_ttl_seconds
+        # The leader keeps this short TTL refreshed while it works, so a leader
+        # that dies without releasing blocks waiters for one TTL at most.
+        self.inflight_ttl_seconds = inflight_ttl_seconds
+        self.fanout_ttl_seconds = fanout_ttl_seconds
+        self.wait_interval_seconds = wait_interval_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+
+    def completed_result(self, job_id: str) -> dict[str, Any] | None:
+        return self.store.get(f"job:{job_id}")
+
+    def record_completed(self, job_id: str, payload: dict[str, Any]) -> None:
+        self.store.put(f"job:{job_id}", payload, self.result_ttl_seconds)
+
+    def run_collapsed(self, work_key: str, execute: Callable[[], dict[str, Any]]) -> dict[str, Any]:
+        result_key = f"work:{work_key}"
+        lock_key = f"inflight:{work_key}"
+        deadline = self.clock() + self.max_wait_seconds
+
+        while True:
+            shared = self.store.get(result_key)
+            if shared is not None:
+                return shared
+
+            token = self.store.acquire(lock_key, self.inflight_ttl_seconds)
+            if token is not None:
+                try:
+                    # A leader may have finished between our read and the acquire.
+                    shared = self.store.get(result_key)
+                    if shared is not None:
+                        return shared
+                    with self._keep_lock(lock_key, token):
+                        value = execute()
+                    self.store.put(result_key, value, self.fanout_ttl_seconds)
+                    return value
+                finally:
+                    # On failure waiters take the lock over and run the work themselves.
+                    self.store.release(lock_key, token)
+
+            if self.clock() >= deadline:
+                logger.warning(
+                    "Gave up waiting %.0fs for in-flight work %s; running it here",
+                    self.max_wait_seconds,
+                    work_key,
+                )
+                return execute()
+            self.store.wait(lock_key, self.wait_interval_seconds)
+
+    def _keep_lock(self, lock_key: str, token: str) -> "_LockHeartbeat":
+        return _LockHeartbeat(self.store, lock_key, token, self.inflight_ttl_seconds)
+
+
+class _LockHeartbeat:
+    def __init__(self, store: IdempotencyStorePort, key: str, token: str, ttl_seconds: float):
+        self._store = store
+        self._key = key
+        self._token = token
+        self._ttl_seconds = ttl_seconds
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="idempotency-lock", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._ttl_seconds / 3):
+            try:
+                if not self._store.refresh(self._key, self._token, self._ttl_seconds):
+                    logger.warning("Lost in-flight lock %s; duplicates may now run", self._key)
+                    return
+            except Exception:  # noqa: BLE001 - keep working; the TTL is the backstop
+                logger.exception("Failed to refresh in-flight lock %s", self._key)
+
+    def __enter__(self) -> "_LockHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._stopped.set()
+        self._thread.join()
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+from .cost_model import (
+    JOB_CLASS_HEAVY,
+    JOB_CLASS_SHORT,
+    JOB_CLASS_STANDARD,
+    JobCostEstimate,
+    TranscodeCostModel,
+)
+from .media_pipeline import MediaPipelineError, extract_metadata, track_encoder_usage
+
+logger = logging.getLogger(__name__)
+
+JobRunner = Callable[[dict[str, Any]], Any]
+MetadataProbe = Callable[[str], dict[str, Any]]
+
+
+@dataclass
+class _DispatchedJob:
+    payload: dict[str, Any]
+    metadata: dict[str, Any]
+    estimate: JobCostEstimate
+    future: Future[Any]
+    enqueued_at: float
+    cores: float = 0.0
+    memory_mb: float = 0.0
+    started_at: float = 0.0
+
+
+@dataclass
+class _ClassCounters:
+    completed: int = 0
+    estimated_cpu_seconds: float = 0.0
+    reserved_core_seconds: float = 0.0
+    queue_seconds: float = 0.0
+    # Only jobs that ran the encoder have a measured cost to compare against.
+    measured: int = 0
+    measured_estimated_cpu_seconds: float = 0.0
+    actual_cpu_seconds: float = 0.0
+
+
+@dataclass
+class _DispatchTotals:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    withdrawn: int = 0
+    by_class: dict[str, _ClassCounters] = field(
+        default_factory=lambda: {
+            name: _ClassCounters()
+            for name in (JOB_CLASS_SHORT, JOB_CLASS_STANDARD, JOB_CLASS_HEAVY)
+        }
+    )
+
+
+class CostAwareDispatcher:
+    def __init__(
+        self,
+        run_job: JobRunner,
+        cost_model: TranscodeCostModel,
+        cpu_cores: float,
+        memory_mb: float,
+        short_job_reserve_fraction: float = 0.25,
+        max_heavy_jobs: int = 1,
+        max_queue_delay_seconds: float = 300.0,
+        probe: MetadataProbe = extract_metadata,
+        clock: Callable[[], float] = time.monotonic,
+        recent_jobs_limit: int = 50,
+    ):
+        self.run_job = run_job
+        self.cost_model = cost_model
+        self.cpu_cores = max(1.0, cpu_cores)
+        self.memory_mb = max(1.0, memory_mb)
+        self.short_job_reserve_fraction = min(max(short_job_reserve_fraction, 0.0), 0.9)
+        self.max_heavy_jobs = max(1, max_heavy_jobs)
+        self.max_queue_delay_seconds = max_queue_delay_seconds
+        self.probe = probe
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queued: list[_DispatchedJob] = []
+        self._running: list[_DispatchedJob] = []
+        self._totals = _DispatchTotals()
+        self._recent: deque[dict[str, Any]] = deque(maxlen=recent_jobs_limit)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(self.cpu_cores)), thread_name_prefix="media-job"
+        )
+
+    @property
+    def general_cores(self) -> float:
+        return self.cpu_cores * (1 - self.short_job_reserve_fraction)
+
+    @property
+    def general_memory_mb(self) -> float:
+        return self.memory_mb * (1 - self.short_job_reserve_fraction)
+
+    def submit(self, payload: dict[str, Any]) -> Future[Any]:
+        try:
+            metadata = self.probe(str(payload.get("sourceUrl", "")))
+        except MediaPipelineError:
+            # The pipeline rejects the same source straight away, so it costs next to nothing.
+            metadata = {}
+        estimate = self.cost_model.estimate(metadata)
+        job = _DispatchedJob(
+            payload=payload,
+            metadata=metadata,
+            estimate=estimate,
+            future=Future(),
+            enqueued_at=self.clock(),
+        )
+        with self._lock:
+            self._totals.submitted += 1
+            self._queued.append(job)
+            self._schedule_locked()
+        return job.future
+
+    def _reservation(self, estimate: JobCostEstimate) -> tuple[float, float]:
+        # Short jobs may use the whole budget; everything else is packed into the
+        # general pool so the reserve stays free for short work.
+        if estimate.job_class == JOB_CLASS_SHORT:
+            return min(estimate.cores, self.cpu_cores), min(estimate.memory_mb, self.memory_mb)
+        return (
+            min(estimate.cores, self.general_cores),
+            min(estimate.memory_mb, self.general_memory_mb),
+        )
+
+    def _fits_locked(self, job: _DispatchedJob, cores: float, memory_mb: float) -> bool:
+        if not self._running:
+            return True
+        used_cores = sum(running.cores for running in self._running)
+        used_memory = sum(running.memory_mb for running in self._running)
+        if job.estimate.job_class == JOB_CLASS_SHORT:
+            return (
+                used_cores + cores <= self.cpu_cores and used_memory + memory_mb <= self.memory_mb
+            )
+
+        general = [
+            running for running in self._running if running.estimate.job_class != JOB_CLASS_SHORT
+        ]
+        general_cores = sum(running.cores for running in general)
+        general_memory = sum(running.memory_mb for running in general)
+        return (
+            general_cores + cores <= self.general_cores
+            and general_memory + memory_mb <= self.general_memory_mb
+            and used_cores + cores <= self.cpu_cores
+            and used_memory + memory_mb <= self.memory_mb
+        )
+
+    def _heavy_capped_locked(self) -> bool:
+        heavy_running = sum(
+            1 for running in self._running if running.estimate.job_class == JOB_CLASS_HEAVY
+        )
+        return heavy_running >= self.max_heavy_jobs
+
+    def _schedule_locked(self) -> None:
+        now = self.clock()
+        starving = False
+        for job in list(self._queued):
+            is_short = job.estimate.job_class == JOB_CLASS_SHORT
+            if starving and not is_short:
+                continue
+            if job.estimate.job_class == JOB_CLASS_HEAVY and self._heavy_capped_locked():
+                # Only a finishing heavy job frees this slot, so holding back
+                # other work would not make it start any sooner.
+                continue
+            cores, memory_mb = self._reservation(job.estimate)
+            if self._fits_locked(job, cores, memory_mb):
+                self._start_locked(job, cores, memory_mb, now)
+            elif not is_short and now - job.enqueued_at >= self.max_queue_delay_seconds:
+                # Stop backfilling around a job that has waited too long; only
+                # short jobs may still use the reserve until it fits.
+                starving = True
+
+    def _start_locked(
+        self, job: _DispatchedJob, cores: float, memory_mb: float, now: float
+    ) -> None:
+        self._queued.remove(job)
+        job.cores = cores
+        job.memory_mb = memory_mb
+        job.started_at = now
+        self._running.append(job)
+        self._executor.submit(self._execute, job)
+
+    def _execute(self, job: _DispatchedJob) -> None:
+        error: Exception | None = None
+        result: Any = None
+        with track_encoder_usage() as usage:
+            try:
+                result = self.run_job(job.payload)
+            except Exception as caught:  # noqa: BLE001 - surfaced through the job future
+                error = caught
+                if not isinstance(caught, (ValueError, MediaPipelineError)):
+                    logger.error("Media job %s failed", job.payload.get("jobId"), exc_info=caught)
+
+        finished_at = self.clock()
+        reserved_core_seconds = (finished_at - job.started_at) * job.cores
+        # Deduplicated and collapsed jobs return without running the encoder, and
+        # early failures say nothing about transcode cost, so neither calibrates.
+        measured_cpu_seconds = usage.cpu_seconds if usage.runs and error is None else None
+        if measured_cpu_seconds is not None:
+            self.cost_model.observe(job.metadata, measured_cpu_seconds)
+        with self._lock:
+            self._running.remove(job)
+            self._record_locked(
+                job, reserved_core_seconds, measured_cpu_seconds, failed=error is not None
+            )
+            self._schedule_locked()
+            self._idle.notify_all()
+
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _record_locked(
+        self,
+        job: _DispatchedJob,
+        reserved_core_seconds: float,
+        measured_cpu_seconds: float | None,
+        failed: bool,
+    ) -> None:
+        counters = self._totals.by_class[job.estimate.job_class]
+        counters.completed += 1
+        counters.estimated_cpu_seconds += job.estimate.cpu_seconds
+        counters.reserved_core_seconds += reserved_core_seconds
+        counters.queue_seconds += job.started_at - job.enqueued_at
+        if measured_cpu_seconds is not None:
+            counters.measured += 1
+            counters.measured_estimated_cpu_seconds += job.estimate.cpu_seconds
+            counters.actual_cpu_seconds += measured_cpu_seconds
+        self._totals.completed += 1
+        if failed:
+            self._totals.failed += 1
+        self._recent.append(
+            {
+                "jobId": job.payload.get("jobId"),
+                "estimate": job.estimate.to_dict(),
+                "actualCpuSeconds": (
+                    round(measured_cpu_seconds, 3) if measured_cpu_seconds is not None else None
+                ),
+                "reservedCoreSeconds": round(reserved_core_seconds, 3),
+                "queueSeconds": round(job.started_at - job.enqueued_at, 3),
+                "failed": failed,
+            }
+        )
+
+    def withdraw_queued(self) -> list[dict[str, Any]]:
+        # Hands back jobs that have not started, oldest first; their futures are cancelled.
+        with self._lock:
+            withdrawn = list(self._queued)
+            self._queued.clear()
+            self._totals.withdrawn += len(withdrawn)
+            self._idle.notify_all()
+        for job in withdrawn:
+            job.future.cancel()
+        return [job.payload for job in withdrawn]
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return len(self._queued)
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queued and not self._running, timeout)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            by_class = {
+                name: {
+                    "queued": sum(1 for job in self._queued if job.estimate.job_class == name),
+                    "running": sum(1 for job in self._running if job.estimate.job_class == name),
+                    "completed": counters.completed,
+                    "measured": counters.measured,
+                    "estimatedCpuSeconds": round(counters.estimated_cpu_seconds, 3),
+                    "actualCpuSeconds": round(counters.actual_cpu_seconds, 3),
+                    "reservedCoreSeconds": round(counters.reserved_core_seconds, 3),
+                    "averageQueueSeconds": (
+                        round(counters.queue_seconds / counters.completed, 3)
+                        if counters.completed
+                        else 0.0
+                    ),
+                }
+                for name, counters in self._totals.by_class.items()
+            }
+            classes = self._totals.by_class.values()
+            estimated = sum(counters.estimated_cpu_seconds for counters in classes)
+            measured_estimate = sum(counters.measured_estimated_cpu_seconds for counters in classes)
+            actual = sum(counters.actual_cpu_seconds for counters in classes)
+            reserved = sum(counters.reserved_core_seconds for counters in classes)
+            return {
+                "submittedTotal": self._totals.submitted,
+                "completedTotal": self._totals.completed,
+                "failedTotal": self._totals.failed,
+                "withdrawnTotal": self._totals.withdrawn,
+                "queued": len(self._queued),
+                "running": len(self._running),
+                "coresInUse": round(sum(job.cores for job in self._running), 3),
+                "memoryMbInUse": round(sum(job.memory_mb for job in self._running), 1),
+                "estimatedCpuSecondsTotal": round(estimated, 3),
+                "actualCpuSecondsTotal": round(actual, 3),
+                "reservedCoreSecondsTotal": round(reserved, 3),
+                "estimateRatio": (
+                    round(actual / measured_estimate, 4) if measured_estimate else 0.0
+                ),
+                "byClass": by_class,
+                "calibration": self.cost_model.calibration(),
+                "recentJobs": list(self._recent),
+            }
+
+    def close(self, timeout: float | None = None) -> None:
+        # Queued jobs were already taken off the broker, so they run to completion.
+        self.wait_idle(timeout)
+        self._executor.shutdown(wait=True)
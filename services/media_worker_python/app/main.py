@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import logging
+import os
 from collections.abc import Callable
 from typing import Any
 
@@ -19,12 +21,24 @@ except ImportError:  # pragma: no cover
             return decorator
 
 
-from .api_callback import CallbackClient
+from .api_callback import CallbackClient, CallbackClientPort
+from .artifact_uploader import MultipartUploader, S3CompatibleClient
+from .callback_outbox import CallbackOutbox, OutboxCallbackClient
+from .cost_model import TranscodeCostModel
+from .idempotency import (
+    InMemoryIdempotencyStore,
+    JobDeduplicator,
+    RedisIdempotencyStore,
+    work_key,
+)
+from .job_dispatcher import CostAwareDispatcher
 from .media_pipeline import MediaPipelineError, process_media_job
-from .models import MediaJob, utc_now_iso
+from .models import MediaJob, MediaProcessingResult, ProxyStreamProgress, utc_now_iso
 from .queue_consumer import QueueClientPort, RedisQueueClient
 from .settings import Settings, load_settings
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="StudioOS Media Worker", version="0.1.0")
 
 
@@ -36,13 +50,20 @@ def health() -> dict[str, str]:
 def process_single_media_job(
     payload: dict[str, Any],
     settings: Settings,
-    callback_client: CallbackClient,
+    callback_client: CallbackClientPort,
+    deduplicator: JobDeduplicator | None = None,
+    uploader: MultipartUploader | None = None,
 ) -> dict[str, Any]:
     job = MediaJob.from_payload(payload)
 
     if not job.job_id or not job.asset_id or not job.organization_id:
         raise ValueError("Invalid media job payload")
 
+    if deduplicator is not None:
+        completed = deduplicator.completed_result(job.job_id)
+        if completed is not None:
+            return completed
+
     callback_client.post_status(
         job.callback_path,
         {
@@ -54,8 +75,52 @@ def process_single_media_job(
         },
     )
 
+    on_proxy_progress: Callable[[ProxyStreamProgress], None] | None = None
+    if settings.proxy_streaming and uploader is not None:
+        partial_posted = False
+
+        def post_partial(progress: ProxyStreamProgress) -> None:
+            nonlocal partial_posted
+            if partial_posted or progress.complete:
+                return
+            if progress.segments_ready < settings.proxy_partial_ready_segments:
+                return
+            partial_posted = True
+            callback_client.post_status(
+                job.callback_path,
+                {
+                    "jobId": job.job_id,
+                    "organizationId": job.organization_id,
+                    "assetId": job.asset_id,
+                    "status": "partial",
+                    "playlistUrl": progress.playlist_url,
+                    "segmentsReady": progress.segments_ready,
+                    "totalSegments": progress.total_segments,
+                    "processedAt": utc_now_iso(),
+                },
+            )
+
+        on_proxy_progress = post_partial
+
+    def run_pipeline() -> MediaProcessingResult:
+        return process_media_job(
+            job,
+            settings.ffmpeg_binary_path,
+            on_proxy_progress=on_proxy_progress,
+            segment_seconds=settings.proxy_segment_seconds,
+            uploader=uploader,
+        )
+
     try:
-        result = process_media_job(job, settings.ffmpeg_binary_path)
+        if deduplicator is None:
+            result = run_pipeline()
+        else:
+            result = MediaProcessingResult.from_dict(
+                deduplicator.run_collapsed(
+                    work_key(job.organization_id, job.asset_id, job.source_url),
+                    lambda: run_pipeline().to_dict(),
+                )
+            )
     except MediaPipelineError as error:
         callback_client.post_status(
             job.callback_path,
@@ -80,28 +145,102 @@ def process_single_media_job(
         "proxyUrl": result.proxy_url,
         "processedAt": utc_now_iso(),
     }
+    if result.playlist_url:
+        completion_payload["playlistUrl"] = result.playlist_url
 
     callback_client.post_status(job.callback_path, completion_payload)
+    if deduplicator is not None:
+        deduplicator.record_completed(job.job_id, completion_payload)
     return completion_payload
 
 
 def run_consumer_iteration(
     queue_client: QueueClientPort,
     settings: Settings,
-    callback_client: CallbackClient,
+    callback_client: CallbackClientPort,
+    deduplicator: JobDeduplicator | None = None,
+    uploader: MultipartUploader | None = None,
 ) -> dict[str, Any] | None:
     payload = queue_client.pop_job(settings.media_jobs_queue)
     if payload is None:
         return None
 
-    return process_single_media_job(payload, settings, callback_client)
+    return process_single_media_job(payload, settings, callback_client, deduplicator, uploader)
 
 
-def build_runtime() -> tuple[Settings, QueueClientPort, CallbackClient]:
-    settings = load_settings()
-    queue_client = RedisQueueClient(settings.redis_url)
-    callback_client = CallbackClient(
+def build_callback_client(settings: Settings, outbox_partition: str = "main") -> CallbackClientPort:
+    client = CallbackClient(
         base_url=settings.api_base_url,
         callback_token=settings.callback_token,
     )
+    if not settings.callback_outbox_dir:
+        return client
+
+    outbox_client = OutboxCallbackClient(
+        CallbackOutbox(os.path.join(settings.callback_outbox_dir, outbox_partition)),
+        client,
+        replay_concurrency=settings.callback_outbox_replay_concurrency,
+        max_attempts=settings.callback_max_attempts,
+    )
+    outbox_client.start()
+    return outbox_client
+
+
+def build_uploader(settings: Settings) -> MultipartUploader | None:
+    if not settings.s3_endpoint_url:
+        if settings.proxy_streaming:
+            logger.warning(
+                "MEDIA_WORKER_PROXY_STREAMING needs S3_ENDPOINT_URL to upload segments to; "
+                "proxies are not streamed"
+            )
+        return None
+    return MultipartUploader(
+        S3CompatibleClient(
+            settings.s3_endpoint_url,
+            settings.s3_bucket,
+            region=settings.aws_region,
+            access_key_id=settings.aws_access_key_id,
+            secret_access_key=settings.aws_secret_access_key,
+        ),
+        part_size_bytes=settings.upload_part_size_mb * 1024 * 1024,
+        max_concurrency=settings.upload_concurrency,
+    )
+
+
+def build_dispatcher(
+    settings: Settings,
+    callback_client: CallbackClientPort,
+    deduplicator: JobDeduplicator | None = None,
+    uploader: MultipartUploader | None = None,
+) -> CostAwareDispatcher:
+    return CostAwareDispatcher(
+        lambda payload: process_single_media_job(
+            payload, settings, callback_client, deduplicator, uploader
+        ),
+        TranscodeCostModel(
+            short_job_cpu_seconds=settings.short_job_cpu_seconds,
+            heavy_job_cpu_seconds=settings.heavy_job_cpu_seconds,
+        ),
+        cpu_cores=settings.job_cpu_cores or os.cpu_count() or 1,
+        memory_mb=settings.job_memory_mb,
+        short_job_reserve_fraction=settings.short_job_reserve_fraction,
+        max_heavy_jobs=settings.max_heavy_jobs,
+    )
+
+
+def build_deduplicator(settings: Settings) -> JobDeduplicator:
+    if settings.idempotency_backend == "redis":
+        return JobDeduplicator(
+            RedisIdempotencyStore(settings.redis_url, namespace="media-worker:idempotency"),
+            result_ttl_seconds=settings.idempotency_ttl_seconds,
+        )
+    return JobDeduplicator(
+        InMemoryIdempotencyStore(), result_ttl_seconds=settings.idempotency_ttl_seconds
+    )
+
+
+def build_runtime() -> tuple[Settings, QueueClientPort, CallbackClientPort]:
+    settings = load_settings()
+    queue_client = RedisQueueClient(settings.redis_url)
+    callback_client = build_callback_client(settings)
     return settings, queue_client, callback_client
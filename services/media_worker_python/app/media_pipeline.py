@@ -1,14 +1,114 @@
 from __future__ import annotations
 
+import math
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from typing import Any
 
-from .models import MediaJob, MediaProcessingResult
+from .artifact_uploader import ArtifactUploadError, MultipartUploader
+from .models import MediaJob, MediaProcessingResult, ProxyStreamProgress
+
+HLS_INIT_SEGMENT = "init.mp4"
+HLS_PLAYLIST = "index.m3u8"
+STDERR_TAIL_BYTES = 2048
 
 
 class MediaPipelineError(Exception):
     pass
 
 
+@dataclass
+class EncoderUsage:
+    runs: int = 0
+    cpu_seconds: float = 0.0
+
+
+_encoder_usage: ContextVar[EncoderUsage | None] = ContextVar("encoder_usage", default=None)
+
+
+@contextmanager
+def track_encoder_usage() -> Iterator[EncoderUsage]:
+    # Collects the CPU time of every encoder the current job runs, so callers can
+    # tell a real transcode from a job that returned a stored result.
+    usage = EncoderUsage()
+    token = _encoder_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _encoder_usage.reset(token)
+
+
+def record_encoder_usage(cpu_seconds: float) -> None:
+    usage = _encoder_usage.get()
+    if usage is not None:
+        usage.runs += 1
+        usage.cpu_seconds += cpu_seconds
+
+
+class _Encoder:
+    """An FFmpeg child whose CPU time is charged to the running job."""
+
+    def __init__(self, command: list[str], stdout: int):
+        try:
+            self.process = subprocess.Popen(command, stdout=stdout, stderr=subprocess.PIPE)
+        except OSError as error:
+            raise MediaPipelineError(f"Unable to start proxy encoder: {error}") from error
+        self._stderr_tail = bytearray()
+        self._stderr_reader = threading.Thread(
+            target=self._drain_stderr, name="ffmpeg-stderr", daemon=True
+        )
+        self._stderr_reader.start()
+
+    def _drain_stderr(self) -> None:
+        # Drained continuously so a chatty encoder never blocks on a full pipe;
+        # only the tail is kept for the error message.
+        assert self.process.stderr is not None
+        with self.process.stderr:
+            while chunk := self.process.stderr.read(4096):
+                self._stderr_tail.extend(chunk)
+                del self._stderr_tail[:-STDERR_TAIL_BYTES]
+
+    def _reap(self, block: bool) -> int | None:
+        # wait4 reports this encoder's own CPU time; RUSAGE_CHILDREN would mix in
+        # encoders of other jobs running in the same process. Popen.poll/wait
+        # would reap the process without it, so they are never used here.
+        pid, status, rusage = os.wait4(self.process.pid, 0 if block else os.WNOHANG)
+        if pid == 0:
+            return None
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        record_encoder_usage(rusage.ru_utime + rusage.ru_stime)
+        return self.process.returncode
+
+    def poll(self) -> int | None:
+        return self._reap(block=False)
+
+    def wait(self) -> int:
+        return_code = self._reap(block=True)
+        assert return_code is not None
+        return return_code
+
+    def kill(self) -> None:
+        # os.kill rather than Popen.kill, which polls and could reap the encoder.
+        os.kill(self.process.pid, signal.SIGKILL)
+        self.wait()
+
+    def check(self, return_code: int) -> None:
+        if return_code == 0:
+            return
+        self._stderr_reader.join(5)
+        detail = self._stderr_tail.decode("utf-8", "replace").strip()
+        message = f"Proxy encoder exited with status {return_code}"
+        raise MediaPipelineError(f"{message}: {detail}" if detail else message)
+
+
 def extract_metadata(source_url: str) -> dict[str, Any]:
     if not source_url.startswith(("http://", "https://", "s3://")):
         raise MediaPipelineError("Unsupported source URL")
@@ -34,11 +134,248 @@ def generate_proxy(source_url: str, asset_id: str, ffmpeg_binary_path: str) -> s
     return f"{source_url.rstrip('/')}/proxy/{asset_id}.mp4"
 
 
-def process_media_job(job: MediaJob, ffmpeg_binary_path: str) -> MediaProcessingResult:
+def build_proxy_command(ffmpeg_binary_path: str, source_url: str) -> list[str]:
+    # Fragmented MP4 can be written to a pipe, so the upload starts with the first fragment.
+    return [
+        ffmpeg_binary_path,
+        "-i",
+        source_url,
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-c:a",
+        "aac",
+        "-movflags",
+        "frag_keyframe+empty_moov+default_base_moof",
+        "-f",
+        "mp4",
+        "pipe:1",
+    ]
+
+
+def encode_proxy_stream(
+    source_url: str, ffmpeg_binary_path: str, chunk_size: int = 1024 * 1024
+) -> Iterator[bytes]:
+    encoder = _Encoder(build_proxy_command(ffmpeg_binary_path, source_url), subprocess.PIPE)
+    stdout = encoder.process.stdout
+    assert stdout is not None
+    finished = False
+    try:
+        with stdout:
+            while chunk := stdout.read(chunk_size):
+                yield chunk
+        finished = True
+    finally:
+        if not finished:
+            encoder.kill()
+    encoder.check(encoder.wait())
+
+
+def hls_segment_name(index: int) -> str:
+    return f"segment-{index:05d}.m4s"
+
+
+def build_hls_proxy_command(
+    ffmpeg_binary_path: str, source_url: str, output_dir: str, segment_seconds: int
+) -> list[str]:
+    # EVENT playlists only ever grow, so players can start on the first segments
+    # while the encoder keeps appending.
+    return [
+        ffmpeg_binary_path,
+        "-i",
+        source_url,
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-c:a",
+        "aac",
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{segment_seconds})",
+        "-f",
+        "hls",
+        "-hls_time",
+        str(segment_seconds),
+        "-hls_playlist_type",
+        "event",
+        "-hls_segment_type",
+        "fmp4",
+        "-hls_flags",
+        "temp_file",
+        "-hls_fmp4_init_filename",
+        HLS_INIT_SEGMENT,
+        "-hls_segment_filename",
+        f"{output_dir.rstrip('/')}/segment-%05d.m4s",
+        f"{output_dir.rstrip('/')}/{HLS_PLAYLIST}",
+    ]
+
+
+def render_hls_playlist(
+    segment_durations: list[float], segment_seconds: int, complete: bool
+) -> str:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(segment_durations, default=segment_seconds))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+        f'#EXT-X-MAP:URI="{HLS_INIT_SEGMENT}"',
+    ]
+    for index, duration in enumerate(segment_durations):
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(hls_segment_name(index))
+    if complete:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def _read_hls_segments(playlist_path: str) -> list[tuple[float, str]]:
+    try:
+        with open(playlist_path, encoding="utf-8") as handle:
+            text = handle.read()
+    except FileNotFoundError:
+        return []
+
+    segments: list[tuple[float, str]] = []
+    duration: float | None = None
+    for line in text.splitlines(keepends=True):
+        # A line without its newline may still be being written.
+        if not line.endswith("\n"):
+            break
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line.removeprefix("#EXTINF:").split(",", 1)[0])
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((duration, line))
+            duration = None
+    return segments
+
+
+def _upload_file(uploader: MultipartUploader, key: str, path: str) -> None:
+    with open(path, "rb") as handle:
+        uploader.put(key, handle.read())
+    # Uploaded segments are never read again, so long sources do not fill the disk.
+    os.remove(path)
+
+
+def stream_proxy_segments(
+    source_url: str,
+    key_prefix: str,
+    metadata: dict[str, Any],
+    ffmpeg_binary_path: str,
+    segment_seconds: int,
+    uploader: MultipartUploader,
+    poll_interval_seconds: float = 0.25,
+) -> Iterator[ProxyStreamProgress]:
+    if segment_seconds <= 0:
+        raise MediaPipelineError("Proxy segment duration must be greater than zero")
+
+    expected_segments = math.ceil(float(metadata.get("durationSeconds", 0)) / segment_seconds)
+    playlist_key = f"{key_prefix}/{HLS_PLAYLIST}"
+    with tempfile.TemporaryDirectory(prefix="hls-proxy-") as output_dir:
+        encoder = _Encoder(
+            build_hls_proxy_command(ffmpeg_binary_path, source_url, output_dir, segment_seconds),
+            subprocess.DEVNULL,
+        )
+        try:
+            segment_durations: list[float] = []
+            while True:
+                return_code = encoder.poll()
+                # Read after the exit check so segments listed just before exit are not lost.
+                written = _read_hls_segments(os.path.join(output_dir, HLS_PLAYLIST))
+                if return_code is not None:
+                    encoder.check(return_code)
+                new_segments = written[len(segment_durations) :]
+                if new_segments and not segment_durations:
+                    _upload_file(
+                        uploader,
+                        f"{key_prefix}/{HLS_INIT_SEGMENT}",
+                        os.path.join(output_dir, HLS_INIT_SEGMENT),
+                    )
+                for duration, name in new_segments:
+                    # Renamed to the names render_hls_playlist lists.
+                    _upload_file(
+                        uploader,
+                        f"{key_prefix}/{hls_segment_name(len(segment_durations))}",
+                        os.path.join(output_dir, name),
+                    )
+                    segment_durations.append(duration)
+                if return_code is not None:
+                    break
+                if new_segments:
+                    playlist = render_hls_playlist(segment_durations, segment_seconds, False)
+                    yield ProxyStreamProgress(
+                        playlist_url=uploader.put(playlist_key, playlist.encode("utf-8")).url,
+                        playlist=playlist,
+                        segments_ready=len(segment_durations),
+                        total_segments=max(len(segment_durations), expected_segments),
+                        complete=False,
+                    )
+                time.sleep(poll_interval_seconds)
+
+            if not segment_durations:
+                raise MediaPipelineError("Proxy encoder exited without writing any segments")
+            playlist = render_hls_playlist(segment_durations, segment_seconds, True)
+            playlist_url = uploader.put(playlist_key, playlist.encode("utf-8")).url
+        except ArtifactUploadError as error:
+            raise MediaPipelineError(f"Proxy upload failed: {error}") from error
+        finally:
+            if encoder.process.returncode is None:
+                encoder.kill()
+
+    yield ProxyStreamProgress(
+        playlist_url=playlist_url,
+        playlist=playlist,
+        segments_ready=len(segment_durations),
+        total_segments=len(segment_durations),
+        complete=True,
+    )
+
+
+def process_media_job(
+    job: MediaJob,
+    ffmpeg_binary_path: str,
+    on_proxy_progress: Callable[[ProxyStreamProgress], None] | None = None,
+    segment_seconds: int = 4,
+    uploader: MultipartUploader | None = None,
+    proxy_encoder: Callable[[str, str], Iterable[bytes]] = encode_proxy_stream,
+) -> MediaProcessingResult:
     metadata = extract_metadata(job.source_url)
     thumbnail_url = generate_thumbnail(job.source_url, job.asset_id)
-    proxy_url = generate_proxy(job.source_url, job.asset_id, ffmpeg_binary_path)
 
+    if on_proxy_progress is not None and uploader is not None:
+        # Segments are uploaded as the encoder writes them, so playback can start
+        # before the whole proxy exists.
+        playlist_url: str | None = None
+        for progress in stream_proxy_segments(
+            job.source_url,
+            f"proxy/{job.organization_id}/{job.asset_id}",
+            metadata,
+            ffmpeg_binary_path,
+            segment_seconds,
+            uploader,
+        ):
+            playlist_url = progress.playlist_url
+            on_proxy_progress(progress)
+        return MediaProcessingResult(
+            metadata=metadata,
+            thumbnail_url=thumbnail_url,
+            proxy_url=playlist_url,
+            playlist_url=playlist_url,
+        )
+
+    if uploader is None:
+        proxy_url = generate_proxy(job.source_url, job.asset_id, ffmpeg_binary_path)
+    else:
+        # Encoder output is consumed part by part, so uploads overlap with encoding.
+        try:
+            proxy_url = uploader.upload_stream(
+                f"proxy/{job.organization_id}/{job.asset_id}.mp4",
+                proxy_encoder(job.source_url, ffmpeg_binary_path),
+            ).url
+        except ArtifactUploadError as error:
+            raise MediaPipelineError(f"Proxy upload failed: {error}") from error
     return MediaProcessingResult(
         metadata=metadata,
         thumbnail_url=thumbnail_url,
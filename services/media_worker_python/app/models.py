@@ -27,6 +27,33 @@ class MediaProcessingResult:
     metadata: dict[str, Any]
     thumbnail_url: str
     proxy_url: str | None
+    playlist_url: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "metadata": self.metadata,
+            "thumbnailUrl": self.thumbnail_url,
+            "proxyUrl": self.proxy_url,
+            "playlistUrl": self.playlist_url,
+        }
+
+    @staticmethod
+    def from_dict(value: dict[str, Any]) -> "MediaProcessingResult":
+        return MediaProcessingResult(
+            metadata=dict(value.get("metadata", {})),
+            thumbnail_url=str(value.get("thumbnailUrl", "")),
+            proxy_url=value.get("proxyUrl"),
+            playlist_url=value.get("playlistUrl"),
+        )
+
+
+@dataclass(frozen=True)
+class ProxyStreamProgress:
+    playlist_url: str
+    playlist: str
+    segments_ready: int
+    total_segments: int
+    complete: bool
 
 
 def utc_now_iso() -> str:
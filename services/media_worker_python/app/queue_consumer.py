@@ -9,6 +9,8 @@ from typing import Any, Protocol
 class QueueClientPort(Protocol):
     def pop_job(self, queue_name: str) -> dict[str, Any] | None: ...
 
+    def requeue_job(self, queue_name: str, payload: dict[str, Any]) -> None: ...
+
 
 @dataclass
 class InMemoryQueueClient(QueueClientPort):
@@ -20,6 +22,10 @@ class InMemoryQueueClient(QueueClientPort):
             return None
         return self.queue.popleft()
 
+    def requeue_job(self, queue_name: str, payload: dict[str, Any]) -> None:
+        _ = queue_name
+        self.queue.appendleft(payload)
+
 
 class RedisQueueClient(QueueClientPort):
     def __init__(self, redis_url: str):
@@ -42,3 +48,7 @@ class RedisQueueClient(QueueClientPort):
         if isinstance(payload, dict):
             return payload
         return None
+
+    def requeue_job(self, queue_name: str, payload: dict[str, Any]) -> None:
+        # Back onto the head, so the job is the next one any worker pops.
+        self._redis.lpush(queue_name, json.dumps(payload))
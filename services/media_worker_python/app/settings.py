@@ -10,6 +10,32 @@ class Settings:
     media_jobs_queue: str
     callback_token: str
     ffmpeg_binary_path: str
+    worker_processes: int = 1
+    worker_max_jobs_per_child: int = 0
+    worker_max_rss_mb: int = 0
+    idempotency_backend: str = "memory"
+    idempotency_ttl_seconds: int = 86400
+    callback_outbox_dir: str = ""
+    callback_outbox_replay_concurrency: int = 8
+    callback_max_attempts: int = 20
+    proxy_streaming: bool = False
+    proxy_segment_seconds: int = 4
+    proxy_partial_ready_segments: int = 2
+    s3_endpoint_url: str = ""
+    s3_bucket: str = "studioos-media"
+    aws_region: str = "us-east-1"
+    aws_access_key_id: str = ""
+    aws_secret_access_key: str = ""
+    upload_part_size_mb: int = 8
+    upload_concurrency: int = 4
+    job_packing: bool = False
+    job_cpu_cores: int = 0
+    job_memory_mb: int = 4096
+    job_prefetch: int = 1
+    short_job_cpu_seconds: float = 30.0
+    short_job_reserve_fraction: float = 0.25
+    heavy_job_cpu_seconds: float = 600.0
+    max_heavy_jobs: int = 1
 
 
 def load_settings() -> Settings:
@@ -20,4 +46,36 @@ def load_settings() -> Settings:
         media_jobs_queue=os.getenv("MEDIA_JOBS_QUEUE", "media-jobs"),
         callback_token=os.getenv("MEDIA_WORKER_CALLBACK_TOKEN", ""),
         ffmpeg_binary_path=os.getenv("FFMPEG_BINARY_PATH", "ffmpeg"),
+        worker_processes=int(os.getenv("MEDIA_WORKER_PROCESSES", "1")),
+        worker_max_jobs_per_child=int(os.getenv("MEDIA_WORKER_MAX_JOBS_PER_CHILD", "0")),
+        worker_max_rss_mb=int(os.getenv("MEDIA_WORKER_MAX_RSS_MB", "0")),
+        idempotency_backend=os.getenv("MEDIA_WORKER_IDEMPOTENCY_BACKEND", "memory"),
+        idempotency_ttl_seconds=int(os.getenv("MEDIA_WORKER_IDEMPOTENCY_TTL_SECONDS", "86400")),
+        callback_outbox_dir=os.getenv("MEDIA_WORKER_CALLBACK_OUTBOX_DIR", ""),
+        callback_outbox_replay_concurrency=int(
+            os.getenv("MEDIA_WORKER_CALLBACK_OUTBOX_REPLAY_CONCURRENCY", "8")
+        ),
+        callback_max_attempts=int(os.getenv("MEDIA_WORKER_CALLBACK_MAX_ATTEMPTS", "20")),
+        proxy_streaming=os.getenv("MEDIA_WORKER_PROXY_STREAMING", "false").lower() == "true",
+        proxy_segment_seconds=int(os.getenv("MEDIA_WORKER_PROXY_SEGMENT_SECONDS", "4")),
+        proxy_partial_ready_segments=int(
+            os.getenv("MEDIA_WORKER_PROXY_PARTIAL_READY_SEGMENTS", "2")
+        ),
+        s3_endpoint_url=os.getenv("S3_ENDPOINT_URL", ""),
+        s3_bucket=os.getenv("S3_BUCKET", "studioos-media"),
+        aws_region=os.getenv("AWS_REGION", "us-east-1"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID", ""),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY", ""),
+        upload_part_size_mb=int(os.getenv("MEDIA_WORKER_UPLOAD_PART_SIZE_MB", "8")),
+        upload_concurrency=int(os.getenv("MEDIA_WORKER_UPLOAD_CONCURRENCY", "4")),
+        job_packing=os.getenv("MEDIA_WORKER_JOB_PACKING", "false").lower() == "true",
+        job_cpu_cores=int(os.getenv("MEDIA_WORKER_JOB_CPU_CORES", "0")),
+        job_memory_mb=int(os.getenv("MEDIA_WORKER_JOB_MEMORY_MB", "4096")),
+        job_prefetch=int(os.getenv("MEDIA_WORKER_JOB_PREFETCH", "1")),
+        short_job_cpu_seconds=float(os.getenv("MEDIA_WORKER_SHORT_JOB_CPU_SECONDS", "30")),
+        short_job_reserve_fraction=float(
+            os.getenv("MEDIA_WORKER_SHORT_JOB_RESERVE_FRACTION", "0.25")
+        ),
+        heavy_job_cpu_seconds=float(os.getenv("MEDIA_WORKER_HEAVY_JOB_CPU_SECONDS", "600")),
+        max_heavy_jobs=int(os.getenv("MEDIA_WORKER_MAX_HEAVY_JOBS", "1")),
     )
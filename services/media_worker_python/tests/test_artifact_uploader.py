@@ -0,0 +1,425 @@
+import base64
+import hashlib
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from app.api_callback import CallbackClient
+from app.artifact_uploader import ArtifactUploadError, MultipartUploader, S3CompatibleClient
+from app.main import process_single_media_job
+from app.media_pipeline import (
+    MediaPipelineError,
+    encode_proxy_stream,
+    process_media_job,
+    track_encoder_usage,
+)
+from app.models import MediaJob
+from app.settings import Settings
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+
+
+class _S3StandIn:
+    """Minimal S3-compatible server: single PUT plus the multipart upload calls."""
+
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.part_failures: dict[int, int] = {}
+        self.corrupt_part_etags: set[int] = set()
+        self.corrupt_part_bodies: set[int] = set()
+        self.complete_failures = 0
+        self.authorization_headers: list[str] = []
+        self.active_part_uploads = 0
+        self.max_active_part_uploads = 0
+        self._lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: object) -> None:
+                return
+
+            def _reply(self, status: int, body: bytes = b"", etag: str | None = None) -> None:
+                self.send_response(status)
+                if etag is not None:
+                    self.send_header("ETag", f'"{etag}"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", "0")))
+
+            def _target(self) -> tuple[str, dict[str, str]]:
+                url = parse.urlsplit(self.path)
+                query = dict(parse.parse_qsl(url.query, keep_blank_values=True))
+                return parse.unquote(url.path), query
+
+            def _md5_ok(self, body: bytes) -> bool:
+                expected = self.headers.get("Content-MD5")
+                digest = base64.b64encode(hashlib.md5(body).digest()).decode("ascii")
+                return expected is None or expected == digest
+
+            def do_PUT(self) -> None:  # noqa: N802
+                path, query = self._target()
+                body = self._body()
+                stand_in.authorization_headers.append(self.headers.get("Authorization", ""))
+                part_number = int(query.get("partNumber", "0"))
+                if part_number in stand_in.corrupt_part_bodies:
+                    # Simulates a body damaged in transit; Content-MD5 catches it.
+                    stand_in.corrupt_part_bodies.discard(part_number)
+                    body = body[::-1]
+                if not self._md5_ok(body):
+                    self._reply(400, b"<Error><Code>BadDigest</Code></Error>")
+                    return
+                if "uploadId" not in query:
+                    stand_in.objects[path] = body
+                    self._reply(200, etag=hashlib.md5(body).hexdigest())
+                    return
+
+                with stand_in._lock:
+                    stand_in.active_part_uploads += 1
+                    stand_in.max_active_part_uploads = max(
+                        stand_in.max_active_part_uploads, stand_in.active_part_uploads
+                    )
+                try:
+                    time.sleep(0.02)
+                    with stand_in._lock:
+                        remaining_failures = stand_in.part_failures.get(part_number, 0)
+                        if remaining_failures:
+                            stand_in.part_failures[part_number] = remaining_failures - 1
+                        corrupt = part_number in stand_in.corrupt_part_etags
+                        stand_in.corrupt_part_etags.discard(part_number)
+                    if remaining_failures:
+                        self._reply(503)
+                        return
+                    stand_in.uploads[query["uploadId"]][part_number] = body
+                    etag = "0" * 32 if corrupt else hashlib.md5(body).hexdigest()
+                    self._reply(200, etag=etag)
+                finally:
+                    with stand_in._lock:
+                        stand_in.active_part_uploads -= 1
+
+            def do_POST(self) -> None:  # noqa: N802
+                path, query = self._target()
+                body = self._body()
+                if "uploads" in query:
+                    upload_id = uuid.uuid4().hex
+                    stand_in.uploads[upload_id] = {}
+                    self._reply(
+                        200,
+                        (
+                            "<InitiateMultipartUploadResult>"
+                            f"<UploadId>{upload_id}</UploadId>"
+                            "</InitiateMultipartUploadResult>"
+                        ).encode("utf-8"),
+                    )
+                    return
+
+                with stand_in._lock:
+                    failing = stand_in.complete_failures > 0
+                    stand_in.complete_failures -= failing
+                if failing:
+                    self._reply(500)
+                    return
+                parts = stand_in.uploads.pop(query["uploadId"])
+                numbers = [int(value) for value in re.findall(rb"<PartNumber>(\d+)<", body)]
+                data = b"".join(parts[number] for number in numbers)
+                digests = b"".join(hashlib.md5(parts[number]).digest() for number in numbers)
+                stand_in.objects[path] = data
+                etag = f"{hashlib.md5(digests).hexdigest()}-{len(numbers)}"
+                self._reply(
+                    200,
+                    (
+                        "<CompleteMultipartUploadResult>"
+                        f"<ETag>&quot;{etag}&quot;</ETag>"
+                        "</CompleteMultipartUploadResult>"
+                    ).encode("utf-8"),
+                )
+
+            def do_DELETE(self) -> None:  # noqa: N802
+                _, query = self._target()
+                stand_in.uploads.pop(query.get("uploadId", ""), None)
+                self._reply(204)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "_S3StandIn":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _fake_encoder(directory: str, script: str) -> str:
+    path = os.path.join(directory, "ffmpeg")
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(f"#!/bin/sh\n{script}\n")
+    os.chmod(path, 0o755)
+    return path
+
+
+def _chunks(total: int, chunk_size: int = 700) -> list[bytes]:
+    payload = bytes(index % 251 for index in range(total))
+    return [payload[offset : offset + chunk_size] for offset in range(0, total, chunk_size)]
+
+
+class ArtifactUploaderTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.stand_in = _S3StandIn().__enter__()
+        self.addCleanup(self.stand_in.__exit__)
+        self.client = S3CompatibleClient(self.stand_in.endpoint_url, "studioos-media")
+
+    def _uploader(self, **options: int) -> MultipartUploader:
+        return MultipartUploader(
+            self.client, part_size_bytes=1024, max_concurrency=4, retry_base_seconds=0, **options
+        )
+
+    def test_multipart_upload_sends_parts_in_parallel(self) -> None:
+        chunks = _chunks(10 * 1024 + 100)
+
+        result = self._uploader().upload_stream("proxy/org-1/asset-1.mp4", iter(chunks))
+
+        self.assertEqual(result.parts, 11)
+        self.assertEqual(result.size, 10 * 1024 + 100)
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/proxy/org-1/asset-1.mp4"], b"".join(chunks)
+        )
+        self.assertGreater(self.stand_in.max_active_part_uploads, 1)
+        self.assertLessEqual(self.stand_in.max_active_part_uploads, 4)
+        self.assertTrue(result.url.endswith("/studioos-media/proxy/org-1/asset-1.mp4"))
+
+    def test_small_artifacts_use_a_single_put(self) -> None:
+        result = self._uploader().upload_stream("thumbnails/asset-1.jpg", iter([b"jpeg-bytes"]))
+
+        self.assertEqual(result.parts, 1)
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/thumbnails/asset-1.jpg"], b"jpeg-bytes"
+        )
+        self.assertEqual(self.stand_in.uploads, {})
+
+    def test_failed_and_corrupted_parts_are_retried(self) -> None:
+        self.stand_in.part_failures = {2: 2}
+        self.stand_in.corrupt_part_bodies = {3}
+        chunks = _chunks(4 * 1024)
+
+        result = self._uploader().upload_stream("proxy/org-1/asset-2.mp4", iter(chunks))
+
+        self.assertEqual(result.parts, 4)
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/proxy/org-1/asset-2.mp4"], b"".join(chunks)
+        )
+        self.assertEqual(self.stand_in.corrupt_part_bodies, set())
+
+    def test_etags_that_are_not_md5_only_warn(self) -> None:
+        # SSE-KMS/SSE-C objects and some S3-compatible stores return opaque ETags.
+        self.stand_in.corrupt_part_etags = {1}
+        chunks = _chunks(3 * 1024)
+
+        with self.assertLogs("app.artifact_uploader", "WARNING") as logs:
+            result = self._uploader().upload_stream("proxy/org-1/asset-4.mp4", iter(chunks))
+
+        self.assertEqual(result.parts, 3)
+        self.assertIn("part 1 of proxy/org-1/asset-4.mp4", logs.output[0])
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/proxy/org-1/asset-4.mp4"], b"".join(chunks)
+        )
+
+    def test_exhausted_retries_abort_the_upload(self) -> None:
+        self.stand_in.part_failures = {1: 10}
+
+        with self.assertRaises(ArtifactUploadError):
+            self._uploader(max_attempts=2).upload_stream(
+                "proxy/org-1/asset-3.mp4", iter(_chunks(3 * 1024))
+            )
+
+        self.assertEqual(self.stand_in.uploads, {})
+        self.assertNotIn("/studioos-media/proxy/org-1/asset-3.mp4", self.stand_in.objects)
+
+    def test_requests_are_signed_when_credentials_are_configured(self) -> None:
+        client = S3CompatibleClient(
+            self.stand_in.endpoint_url,
+            "studioos-media",
+            access_key_id="AKIDEXAMPLE",
+            secret_access_key="secret",
+        )
+
+        client.put_object("thumbnails/asset-1.jpg", b"jpeg-bytes")
+
+        self.assertTrue(
+            self.stand_in.authorization_headers[-1].startswith(
+                "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/"
+            )
+        )
+
+    def test_process_media_job_streams_encoder_output_to_the_store(self) -> None:
+        job = MediaJob(
+            job_id="job-1",
+            organization_id="org-1",
+            asset_id="asset-1",
+            source_url="https://cdn.example.com/media/video.mp4",
+            callback_path="/workers/media/status",
+        )
+        chunks = _chunks(5 * 1024)
+        consumed: list[int] = []
+
+        def encoder(source_url: str, ffmpeg_binary_path: str):
+            _ = (source_url, ffmpeg_binary_path)
+            for chunk in chunks:
+                consumed.append(len(chunk))
+                yield chunk
+
+        result = process_media_job(job, "ffmpeg", uploader=self._uploader(), proxy_encoder=encoder)
+
+        self.assertEqual(result.proxy_url, self.client.object_url("proxy/org-1/asset-1.mp4"))
+        self.assertEqual(sum(consumed), 5 * 1024)
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/proxy/org-1/asset-1.mp4"], b"".join(chunks)
+        )
+
+    def test_streamed_proxy_segments_are_uploaded_to_the_store(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        script = (
+            'for last in "$@"; do :; done\nout=$(dirname "$last")\n'
+            'printf init-segment > "$out/init.mp4"\n'
+            'printf media-segment > "$out/segment-00000.m4s"\n'
+            "printf '#EXTM3U\\n#EXTINF:4.000,\\nsegment-00000.m4s\\n' > \"$out/index.m3u8\""
+        )
+        settings = Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path=_fake_encoder(directory.name, script),
+            proxy_streaming=True,
+            proxy_partial_ready_segments=1,
+        )
+        callback = _RecordingCallbackClient()
+        payload = {
+            "jobId": "job-1",
+            "organizationId": "org-1",
+            "assetId": "asset-1",
+            "sourceUrl": "https://cdn.example.com/media/video.mp4",
+            "callbackPath": "/workers/media/status",
+        }
+
+        result = process_single_media_job(payload, settings, callback, uploader=self._uploader())
+
+        playlist_url = self.client.object_url("proxy/org-1/asset-1/index.m3u8")
+        self.assertEqual(result["proxyUrl"], playlist_url)
+        self.assertEqual(result["playlistUrl"], playlist_url)
+        prefix = "/studioos-media/proxy/org-1/asset-1"
+        self.assertEqual(self.stand_in.objects[f"{prefix}/init.mp4"], b"init-segment")
+        self.assertEqual(self.stand_in.objects[f"{prefix}/segment-00000.m4s"], b"media-segment")
+        self.assertIn(b"#EXT-X-ENDLIST", self.stand_in.objects[f"{prefix}/index.m3u8"])
+
+    def test_unreachable_store_fails_the_job_with_a_callback(self) -> None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path=_fake_encoder(directory.name, "printf fragmented-mp4"),
+        )
+        uploader = MultipartUploader(
+            S3CompatibleClient(f"http://127.0.0.1:{port}", "studioos-media"),
+            max_attempts=2,
+            retry_base_seconds=0,
+        )
+        callback = _RecordingCallbackClient()
+        payload = {
+            "jobId": "job-1",
+            "organizationId": "org-1",
+            "assetId": "asset-1",
+            "sourceUrl": "https://cdn.example.com/media/video.mp4",
+            "callbackPath": "/workers/media/status",
+        }
+
+        with self.assertRaises(MediaPipelineError):
+            process_single_media_job(payload, settings, callback, uploader=uploader)
+
+        self.assertEqual(
+            [status["status"] for status in callback.payloads], ["processing", "failed"]
+        )
+        self.assertIn("after 2 attempts", str(callback.payloads[-1]["error"]))
+
+    def test_failed_multipart_completion_is_retried(self) -> None:
+        self.stand_in.complete_failures = 1
+        chunks = _chunks(3 * 1024)
+
+        result = self._uploader().upload_stream("proxy/org-1/asset-5.mp4", iter(chunks))
+
+        self.assertEqual(result.parts, 3)
+        self.assertEqual(
+            self.stand_in.objects["/studioos-media/proxy/org-1/asset-5.mp4"], b"".join(chunks)
+        )
+
+
+class EncodeProxyStreamTests(unittest.TestCase):
+    def test_encoder_cpu_time_is_measured_for_the_running_job(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        ffmpeg = _fake_encoder(
+            directory.name,
+            "i=0; while [ $i -lt 200000 ]; do i=$((i+1)); done\nprintf fragmented-mp4",
+        )
+
+        with track_encoder_usage() as usage:
+            output = b"".join(encode_proxy_stream("https://cdn.example.com/video.mp4", ffmpeg))
+
+        self.assertEqual(output, b"fragmented-mp4")
+        self.assertEqual(usage.runs, 1)
+        self.assertGreater(usage.cpu_seconds, 0)
+
+    def test_encoder_failure_reports_the_tail_of_stderr(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        ffmpeg = _fake_encoder(
+            directory.name,
+            "i=0; while [ $i -lt 500 ]; do echo progress line $i >&2; i=$((i+1)); done\n"
+            "echo 'moov atom not found' >&2\nexit 1",
+        )
+
+        with self.assertRaises(MediaPipelineError) as context:
+            list(encode_proxy_stream("https://cdn.example.com/media/video.mp4", ffmpeg))
+
+        message = str(context.exception)
+        self.assertIn("exited with status 1", message)
+        self.assertIn("moov atom not found", message)
+        self.assertNotIn("progress line 0\n", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import http.client
+import json
+import os
+import tempfile
+import time
+import unittest
+from urllib.error import HTTPError, URLError
+
+from app.callback_outbox import DEAD_LETTER_FILE, CallbackOutbox, OutboxCallbackClient
+from app.main import process_single_media_job
+from app.settings import Settings
+
+
+class _DeliveryClient:
+    def __init__(self, error: Exception | None = None, failing_job_id: str | None = None) -> None:
+        self.error = error
+        self.failing_job_id = failing_job_id
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        if self.error is not None and self.failing_job_id in (None, payload["jobId"]):
+            raise self.error
+        self.payloads.append(payload)
+
+
+def _status(job_id: str, status: str) -> dict[str, object]:
+    return {"jobId": job_id, "organizationId": "org-1", "assetId": "asset-1", "status": status}
+
+
+class CallbackOutboxTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _client(
+        self,
+        delivery: _DeliveryClient,
+        outbox_options: dict[str, int] | None = None,
+        **client_options: object,
+    ) -> OutboxCallbackClient:
+        client = OutboxCallbackClient(
+            CallbackOutbox(self.directory.name, **(outbox_options or {})),
+            delivery,
+            replay_concurrency=2,
+            **client_options,
+        )
+        self.addCleanup(client.close)
+        return client
+
+    def test_drain_delivers_latest_status_per_job(self) -> None:
+        delivery = _DeliveryClient()
+        client = self._client(delivery)
+
+        client.post_status("/workers/media/status", _status("job-1", "processing"))
+        client.post_status("/workers/media/status", _status("job-2", "processing"))
+        client.post_status("/workers/media/status", _status("job-1", "completed"))
+
+        self.assertEqual(delivery.payloads, [])
+        self.assertEqual(client.drain_once(), 2)
+        self.assertEqual(
+            [(payload["jobId"], payload["status"]) for payload in delivery.payloads],
+            [("job-2", "processing"), ("job-1", "completed")],
+        )
+        self.assertEqual(client.metrics()["depth"], 0)
+
+    def test_backlog_survives_restart_and_replays_in_bulk(self) -> None:
+        outage = _DeliveryClient(URLError("connection refused"))
+        client = self._client(outage)
+        for index in range(5):
+            client.post_status("/workers/media/status", _status(f"job-{index}", "processing"))
+            client.post_status("/workers/media/status", _status(f"job-{index}", "completed"))
+
+        self.assertEqual(client.drain_once(), 0)
+        self.assertEqual(client.metrics()["depth"], 5)
+        self.assertEqual(client.metrics()["failedAttemptsTotal"], 5)
+        client.close()
+
+        delivery = _DeliveryClient()
+        recovered = self._client(delivery)
+
+        # Superseded statuses were tombstoned, so only the five completions come back.
+        self.assertEqual(recovered.metrics()["depth"], 5)
+        self.assertEqual(recovered.drain_once(), 5)
+        self.assertTrue(all(payload["status"] == "completed" for payload in delivery.payloads))
+        self.assertEqual(recovered.metrics()["depth"], 0)
+
+    def test_background_drain_delivers_after_post(self) -> None:
+        delivery = _DeliveryClient()
+        client = self._client(delivery)
+        client.start()
+
+        client.post_status("/workers/media/status", _status("job-1", "completed"))
+
+        deadline = time.monotonic() + 5
+        while not delivery.payloads and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(delivery.payloads), 1)
+
+    def test_non_retryable_rejections_are_dropped(self) -> None:
+        rejected = HTTPError("http://localhost:3000", 422, "Unprocessable", {}, None)
+        client = self._client(_DeliveryClient(rejected))
+
+        client.post_status("/workers/media/status", _status("job-1", "completed"))
+
+        self.assertEqual(client.drain_once(), 1)
+        self.assertEqual(client.metrics()["droppedTotal"], 1)
+        self.assertEqual(client.metrics()["depth"], 0)
+
+    def test_invalid_callback_paths_are_not_retried(self) -> None:
+        client = self._client(_DeliveryClient(http.client.InvalidURL("control characters")))
+
+        client.post_status("/workers/media/status\n", _status("job-1", "completed"))
+
+        self.assertEqual(client.drain_once(), 1)
+        self.assertEqual(client.metrics()["droppedTotal"], 1)
+        self.assertEqual(client.metrics()["depth"], 0)
+
+    def test_failing_callback_does_not_delay_or_replay_later_ones(self) -> None:
+        now = [0.0]
+        outage = _DeliveryClient(URLError("connection refused"), failing_job_id="job-stuck")
+        client = self._client(outage, clock=lambda: now[0])
+
+        client.post_status("/workers/media/status", _status("job-stuck", "completed"))
+        self.assertEqual(client.drain_once(), 0)
+        for index in range(3):
+            client.post_status("/workers/media/status", _status(f"job-{index}", "partial"))
+
+        self.assertEqual(client.drain_once(), 3)
+        self.assertEqual(
+            [payload["jobId"] for payload in outage.payloads], ["job-0", "job-1", "job-2"]
+        )
+        client.close()
+
+        delivery = _DeliveryClient()
+        recovered = self._client(delivery)
+
+        self.assertEqual(recovered.metrics()["depth"], 1)
+        self.assertEqual(recovered.drain_once(), 1)
+        self.assertEqual([payload["jobId"] for payload in delivery.payloads], ["job-stuck"])
+
+    def test_callbacks_are_dead_lettered_after_max_attempts(self) -> None:
+        now = [0.0]
+        client = self._client(
+            _DeliveryClient(URLError("connection refused")), max_attempts=3, clock=lambda: now[0]
+        )
+        client.post_status("/workers/media/status", _status("job-1", "completed"))
+
+        for _ in range(3):
+            client.drain_once()
+            now[0] += 120
+
+        metrics = client.metrics()
+        self.assertEqual((metrics["depth"], metrics["droppedTotal"]), (0, 1))
+        self.assertEqual(metrics["failedAttemptsTotal"], 2)
+        with open(os.path.join(self.directory.name, DEAD_LETTER_FILE), encoding="utf-8") as handle:
+            entries = [json.loads(line) for line in handle]
+        self.assertEqual([(entry["seq"], entry["attempts"]) for entry in entries], [(1, 3)])
+
+    def test_delivered_segments_are_removed(self) -> None:
+        client = self._client(_DeliveryClient(), {"segment_max_bytes": 64})
+        for index in range(6):
+            client.post_status("/workers/media/status", _status(f"job-{index}", "completed"))
+
+        self.assertGreater(client.metrics()["segments"], 1)
+        client.drain_once()
+
+        self.assertEqual(client.metrics()["segments"], 1)
+
+    def test_completed_job_is_not_lost_when_callback_api_is_down(self) -> None:
+        client = self._client(_DeliveryClient(URLError("timed out")))
+        settings = Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path="ffmpeg",
+        )
+        payload = {
+            "jobId": "job-1",
+            "organizationId": "org-1",
+            "assetId": "asset-1",
+            "sourceUrl": "https://cdn.example.com/media/video.mp4",
+            "callbackPath": "/workers/media/status",
+        }
+
+        result = process_single_media_job(payload, settings, client)
+
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(client.metrics()["depth"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
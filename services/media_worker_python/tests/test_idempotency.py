@@ -0,0 +1,249 @@
+import threading
+import time
+import unittest
+
+from app.api_callback import CallbackClient
+from app.idempotency import (
+    InMemoryIdempotencyStore,
+    JobDeduplicator,
+    RedisIdempotencyStore,
+)
+from app.main import process_single_media_job
+from app.settings import Settings
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeRedis:
+    """Just enough of redis-py for the idempotency store: SET NX PX, GET, EVAL."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self.clock = clock
+        self.values: dict[str, tuple[bytes, float | None]] = {}
+        self.set_calls: list[dict[str, object]] = []
+
+    def _live(self, key: str) -> bytes | None:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self.values[key]
+            return None
+        return value
+
+    def get(self, key: str) -> bytes | None:
+        return self._live(key)
+
+    def set(self, key: str, value: str, nx: bool = False, px: int | None = None) -> bool | None:
+        self.set_calls.append({"key": key, "nx": nx, "px": px})
+        if nx and self._live(key) is not None:
+            return None
+        expires_at = self.clock() + px / 1000 if px is not None else None
+        self.values[key] = (value.encode("utf-8"), expires_at)
+        return True
+
+    def eval(self, script: str, numkeys: int, key: str, token: str, *args: object) -> int:
+        _ = numkeys
+        if self._live(key) != token.encode("utf-8"):
+            return 0
+        if "pexpire" in script:
+            self.values[key] = (self.values[key][0], self.clock() + int(args[0]) / 1000)
+        else:
+            del self.values[key]
+        return 1
+
+
+class IdempotencyTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.settings = Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path="ffmpeg",
+        )
+        self.payload = {
+            "jobId": "job-1",
+            "organizationId": "org-1",
+            "assetId": "asset-1",
+            "sourceUrl": "https://cdn.example.com/media/video.mp4",
+            "callbackPath": "/workers/media/status",
+        }
+
+    def test_duplicate_job_id_returns_stored_result_without_callbacks(self) -> None:
+        deduplicator = JobDeduplicator(InMemoryIdempotencyStore())
+        callback = _RecordingCallbackClient()
+
+        first = process_single_media_job(self.payload, self.settings, callback, deduplicator)
+        second = process_single_media_job(self.payload, self.settings, callback, deduplicator)
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(callback.payloads), 2)
+
+    def test_completed_results_expire_after_ttl(self) -> None:
+        clock = _FakeClock()
+        deduplicator = JobDeduplicator(
+            InMemoryIdempotencyStore(clock=clock), result_ttl_seconds=10, fanout_ttl_seconds=1
+        )
+        callback = _RecordingCallbackClient()
+
+        process_single_media_job(self.payload, self.settings, callback, deduplicator)
+        clock.now = 11.0
+        process_single_media_job(self.payload, self.settings, callback, deduplicator)
+
+        self.assertEqual(len(callback.payloads), 4)
+
+    def test_expired_entries_are_evicted_without_being_read_again(self) -> None:
+        clock = _FakeClock()
+        store = InMemoryIdempotencyStore(clock=clock)
+        for index in range(100):
+            store.put(f"job:{index}", {"index": index}, ttl_seconds=10)
+        store.put("job:0", {"index": 0}, ttl_seconds=30)
+
+        clock.now = 11.0
+        store.put("job:fresh", {"index": 100}, ttl_seconds=10)
+
+        self.assertEqual(sorted(store._values), ["job:0", "job:fresh"])
+        self.assertEqual(store.get("job:0"), {"index": 0})
+
+    def test_concurrent_requests_for_same_asset_share_one_execution(self) -> None:
+        deduplicator = JobDeduplicator(InMemoryIdempotencyStore(), wait_interval_seconds=0.01)
+        leader_started = threading.Event()
+        release_leader = threading.Event()
+        executions: list[str] = []
+        results: list[dict[str, object]] = []
+
+        def execute() -> dict[str, object]:
+            executions.append(threading.current_thread().name)
+            leader_started.set()
+            release_leader.wait(5)
+            return {"proxyUrl": "https://cdn.example.com/proxy/asset-1.mp4"}
+
+        def run() -> None:
+            results.append(deduplicator.run_collapsed("org-1/asset-1", execute))
+
+        threads = [threading.Thread(target=run, name=f"worker-{index}") for index in range(4)]
+        threads[0].start()
+        leader_started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release_leader.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_waiter_takes_over_when_leader_fails(self) -> None:
+        deduplicator = JobDeduplicator(InMemoryIdempotencyStore())
+        calls: list[int] = []
+
+        def failing() -> dict[str, object]:
+            calls.append(1)
+            raise RuntimeError("transcode failed")
+
+        with self.assertRaises(RuntimeError):
+            deduplicator.run_collapsed("org-1/asset-2", failing)
+        result = deduplicator.run_collapsed("org-1/asset-2", lambda: {"proxyUrl": "ok"})
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(result, {"proxyUrl": "ok"})
+
+
+class RedisIdempotencyStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = _FakeClock()
+        self.redis = _FakeRedis(self.clock)
+        self.store = RedisIdempotencyStore(
+            "redis://localhost:6379", namespace="media-worker:idempotency", client=self.redis
+        )
+
+    def test_put_and_get_round_trip_with_ttl(self) -> None:
+        self.store.put("job:job-1", {"status": "completed"}, ttl_seconds=10)
+
+        self.assertEqual(self.store.get("job:job-1"), {"status": "completed"})
+        self.assertEqual(
+            self.redis.set_calls[-1],
+            {"key": "media-worker:idempotency:job:job-1", "nx": False, "px": 10000},
+        )
+        self.clock.now = 10.0
+        self.assertIsNone(self.store.get("job:job-1"))
+
+    def test_lock_is_set_nx_with_expiry_and_released_by_owner_only(self) -> None:
+        token = self.store.acquire("inflight:work", ttl_seconds=5)
+
+        self.assertIsNotNone(token)
+        self.assertEqual(
+            self.redis.set_calls[-1],
+            {"key": "media-worker:idempotency:lock:inflight:work", "nx": True, "px": 5000},
+        )
+        self.assertIsNone(self.store.acquire("inflight:work", ttl_seconds=5))
+        self.store.release("inflight:work", "someone-else")
+        self.assertIsNone(self.store.acquire("inflight:work", ttl_seconds=5))
+        self.store.release("inflight:work", token)
+        self.assertIsNotNone(self.store.acquire("inflight:work", ttl_seconds=5))
+
+    def test_expired_holder_cannot_release_or_refresh_the_new_lock(self) -> None:
+        first = self.store.acquire("inflight:work", ttl_seconds=5)
+        self.clock.now = 6.0
+        second = self.store.acquire("inflight:work", ttl_seconds=5)
+
+        self.assertIsNotNone(second)
+        self.assertFalse(self.store.refresh("inflight:work", first, ttl_seconds=5))
+        self.store.release("inflight:work", first)
+        self.assertIsNone(self.store.acquire("inflight:work", ttl_seconds=5))
+        self.assertTrue(self.store.refresh("inflight:work", second, ttl_seconds=5))
+        self.clock.now = 10.0
+        self.assertIsNone(self.store.acquire("inflight:work", ttl_seconds=5))
+
+    def test_leader_keeps_lock_alive_past_its_ttl(self) -> None:
+        store = RedisIdempotencyStore(
+            "redis://localhost:6379", namespace="media-worker:idempotency", client=_FakeRedis()
+        )
+        deduplicator = JobDeduplicator(store, inflight_ttl_seconds=0.09)
+        contested: list[str | None] = []
+
+        def execute() -> dict[str, object]:
+            time.sleep(0.3)
+            contested.append(store.acquire("inflight:work-1", ttl_seconds=1))
+            return {"ok": True}
+
+        self.assertEqual(deduplicator.run_collapsed("work-1", execute), {"ok": True})
+        self.assertEqual(contested, [None])
+
+    def test_waiters_stop_waiting_on_a_dead_leader(self) -> None:
+        self.store.acquire("inflight:work-2", ttl_seconds=3600)
+        deduplicator = JobDeduplicator(
+            self.store, wait_interval_seconds=0.01, max_wait_seconds=5, clock=self.clock
+        )
+
+        def advance(_key: str, _timeout: float) -> None:
+            self.clock.now += 1
+
+        self.store.wait = advance  # type: ignore[method-assign]
+
+        self.assertEqual(deduplicator.run_collapsed("work-2", lambda: {"ok": True}), {"ok": True})
+        self.assertGreaterEqual(self.clock.now, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,341 @@
+import json
+import os
+import threading
+import time
+import unittest
+from collections import deque
+from dataclasses import replace
+
+from app.api_callback import CallbackClient
+from app.cost_model import (
+    JOB_CLASS_HEAVY,
+    JOB_CLASS_SHORT,
+    JOB_CLASS_STANDARD,
+    TranscodeCostModel,
+)
+from app.job_dispatcher import CostAwareDispatcher
+from app.main import build_dispatcher
+from app.media_pipeline import record_encoder_usage
+from app.queue_consumer import InMemoryQueueClient
+from app.settings import Settings
+from app.supervisor import EXIT_RECYCLE, LoadReporter, run_packed_worker_child
+
+# Probed metadata keyed by source URL; the pipeline stub reports the same shape.
+_SOURCES = {
+    "https://cdn.example.com/clip.mp4": {
+        "codec": "h264",
+        "durationSeconds": 10,
+        "width": 1920,
+        "height": 1080,
+    },
+    "https://cdn.example.com/episode.mp4": {
+        "codec": "h264",
+        "durationSeconds": 600,
+        "width": 1920,
+        "height": 1080,
+    },
+    "https://cdn.example.com/lecture.mp4": {
+        "codec": "h264",
+        "durationSeconds": 600,
+        "width": 1280,
+        "height": 720,
+    },
+    "https://cdn.example.com/feature.mov": {
+        "codec": "hevc",
+        "durationSeconds": 7200,
+        "width": 3840,
+        "height": 2160,
+    },
+}
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+
+
+class _GatedRunner:
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.gates: dict[str, threading.Event] = {}
+        self.open = False
+        self.encoder_cpu_seconds: float | None = None
+        self._lock = threading.Lock()
+        self._started_changed = threading.Condition(self._lock)
+
+    def __call__(self, payload: dict[str, object]) -> str:
+        job_id = str(payload["jobId"])
+        with self._lock:
+            gate = self.gates.setdefault(job_id, threading.Event())
+            self.started.append(job_id)
+            self._started_changed.notify_all()
+            if self.open:
+                gate.set()
+        gate.wait(10)
+        if self.encoder_cpu_seconds is not None:
+            record_encoder_usage(self.encoder_cpu_seconds)
+        return job_id
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            self.gates.setdefault(job_id, threading.Event()).set()
+
+    def release_all(self) -> None:
+        with self._lock:
+            self.open = True
+            for gate in self.gates.values():
+                gate.set()
+
+    def wait_started(self, count: int) -> list[str]:
+        with self._started_changed:
+            self._started_changed.wait_for(lambda: len(self.started) >= count, 5)
+            return list(self.started)
+
+
+def _job(job_id: str, source_url: str) -> dict[str, object]:
+    return {
+        "jobId": job_id,
+        "organizationId": "org-1",
+        "assetId": f"asset-{job_id}",
+        "sourceUrl": source_url,
+        "callbackPath": "/workers/media/status",
+    }
+
+
+def _packing_settings(**overrides: object) -> Settings:
+    return replace(
+        Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path="ffmpeg",
+        ),
+        job_packing=True,
+        job_cpu_cores=4,
+        **overrides,
+    )
+
+
+class TranscodeCostModelTests(unittest.TestCase):
+    def test_estimates_scale_with_duration_resolution_and_codec(self) -> None:
+        model = TranscodeCostModel()
+
+        clip = model.estimate(_SOURCES["https://cdn.example.com/clip.mp4"])
+        episode = model.estimate(_SOURCES["https://cdn.example.com/episode.mp4"])
+        feature = model.estimate(_SOURCES["https://cdn.example.com/feature.mov"])
+
+        self.assertEqual(
+            [clip.job_class, episode.job_class, feature.job_class],
+            [JOB_CLASS_SHORT, JOB_CLASS_STANDARD, JOB_CLASS_HEAVY],
+        )
+        self.assertGreater(feature.cpu_seconds, 100 * clip.cpu_seconds)
+        self.assertGreater(feature.memory_mb, clip.memory_mb)
+        self.assertEqual((clip.cores, feature.cores), (2, 4))
+
+    def test_missing_metadata_falls_back_to_fixed_cost(self) -> None:
+        estimate = TranscodeCostModel().estimate({})
+
+        self.assertEqual(estimate.job_class, JOB_CLASS_SHORT)
+        self.assertEqual(estimate.cpu_seconds, 2.0)
+        self.assertEqual(estimate.cores, 1)
+
+    def test_observed_runtimes_calibrate_the_same_codec(self) -> None:
+        model = TranscodeCostModel()
+        episode = _SOURCES["https://cdn.example.com/episode.mp4"]
+        baseline = model.estimate(episode).cpu_seconds
+
+        for _ in range(20):
+            model.observe(episode, actual_cpu_seconds=baseline * 3)
+
+        self.assertAlmostEqual(model.estimate(episode).cpu_seconds, baseline * 3, delta=1.0)
+        self.assertEqual(model.calibration()["h264"]["observations"], 20)
+        feature = _SOURCES["https://cdn.example.com/feature.mov"]
+        self.assertEqual(
+            model.estimate(feature).cpu_seconds, TranscodeCostModel().estimate(feature).cpu_seconds
+        )
+
+
+class CostAwareDispatcherTests(unittest.TestCase):
+    def _dispatcher(self, runner: _GatedRunner, **options: object) -> CostAwareDispatcher:
+        dispatcher = CostAwareDispatcher(
+            runner,
+            TranscodeCostModel(),
+            probe=lambda source_url: _SOURCES[source_url],
+            **{"cpu_cores": 4, "memory_mb": 8192, **options},
+        )
+        self.addCleanup(dispatcher.close, 5)
+        self.addCleanup(runner.release_all)
+        return dispatcher
+
+    def test_short_jobs_use_capacity_reserved_from_longer_jobs(self) -> None:
+        runner = _GatedRunner()
+        dispatcher = self._dispatcher(runner)
+
+        dispatcher.submit(_job("episode-1", "https://cdn.example.com/episode.mp4"))
+        dispatcher.submit(_job("episode-2", "https://cdn.example.com/episode.mp4"))
+        dispatcher.submit(_job("clip-1", "https://cdn.example.com/clip.mp4"))
+
+        self.assertEqual(sorted(runner.wait_started(2)), ["clip-1", "episode-1"])
+        self.assertEqual(dispatcher.metrics()["queued"], 1)
+
+        runner.release("episode-1")
+        self.assertIn("episode-2", runner.wait_started(3))
+
+    def test_concurrent_heavy_transcodes_are_capped(self) -> None:
+        runner = _GatedRunner()
+        dispatcher = self._dispatcher(runner, cpu_cores=16, memory_mb=65536)
+
+        dispatcher.submit(_job("feature-1", "https://cdn.example.com/feature.mov"))
+        dispatcher.submit(_job("feature-2", "https://cdn.example.com/feature.mov"))
+        dispatcher.submit(_job("episode-1", "https://cdn.example.com/episode.mp4"))
+
+        self.assertEqual(sorted(runner.wait_started(2)), ["episode-1", "feature-1"])
+        self.assertEqual(dispatcher.metrics()["byClass"][JOB_CLASS_HEAVY]["queued"], 1)
+
+    def test_jobs_waiting_too_long_stop_backfilling(self) -> None:
+        runner = _GatedRunner()
+        dispatcher = self._dispatcher(runner, max_queue_delay_seconds=0)
+
+        dispatcher.submit(_job("episode-1", "https://cdn.example.com/episode.mp4"))
+        dispatcher.submit(_job("episode-2", "https://cdn.example.com/episode.mp4"))
+        dispatcher.submit(_job("lecture-1", "https://cdn.example.com/lecture.mp4"))
+        dispatcher.submit(_job("clip-1", "https://cdn.example.com/clip.mp4"))
+
+        self.assertEqual(sorted(runner.wait_started(2)), ["clip-1", "episode-1"])
+        self.assertEqual(dispatcher.metrics()["queued"], 2)
+
+    def test_heavy_jobs_held_by_the_cap_do_not_block_backfilling(self) -> None:
+        runner = _GatedRunner()
+        now = [0.0]
+        dispatcher = self._dispatcher(
+            runner, cpu_cores=16, memory_mb=65536, clock=lambda: now[0]
+        )
+
+        dispatcher.submit(_job("feature-1", "https://cdn.example.com/feature.mov"))
+        dispatcher.submit(_job("feature-2", "https://cdn.example.com/feature.mov"))
+        now[0] = 400.0
+        dispatcher.submit(_job("episode-1", "https://cdn.example.com/episode.mp4"))
+
+        self.assertEqual(sorted(runner.wait_started(2)), ["episode-1", "feature-1"])
+        self.assertEqual(dispatcher.metrics()["byClass"][JOB_CLASS_HEAVY]["queued"], 1)
+
+    def test_metrics_report_estimated_next_to_actual_cost(self) -> None:
+        runner = _GatedRunner()
+        runner.encoder_cpu_seconds = 3.5
+        dispatcher = self._dispatcher(runner)
+        future = dispatcher.submit(_job("clip-1", "https://cdn.example.com/clip.mp4"))
+        runner.wait_started(1)
+        time.sleep(0.05)
+        runner.release("clip-1")
+
+        self.assertEqual(future.result(5), "clip-1")
+        self.assertTrue(dispatcher.wait_idle(5))
+        metrics = dispatcher.metrics()
+
+        self.assertEqual(metrics["completedTotal"], 1)
+        self.assertGreater(metrics["estimatedCpuSecondsTotal"], 0)
+        self.assertEqual(metrics["actualCpuSecondsTotal"], 3.5)
+        self.assertGreater(metrics["reservedCoreSecondsTotal"], 0)
+        self.assertEqual(metrics["byClass"][JOB_CLASS_SHORT]["completed"], 1)
+        self.assertEqual(metrics["recentJobs"][0]["jobId"], "clip-1")
+        self.assertEqual(metrics["recentJobs"][0]["actualCpuSeconds"], 3.5)
+        self.assertEqual(metrics["recentJobs"][0]["estimate"]["jobClass"], JOB_CLASS_SHORT)
+        self.assertEqual(metrics["calibration"]["h264"]["observations"], 1)
+
+    def test_jobs_that_skip_the_encoder_do_not_calibrate(self) -> None:
+        runner = _GatedRunner()
+        runner.release_all()
+        dispatcher = self._dispatcher(runner, cpu_cores=16, memory_mb=65536)
+        feature = _SOURCES["https://cdn.example.com/feature.mov"]
+        baseline = dispatcher.cost_model.estimate(feature)
+
+        # Deduplicated and collapsed jobs return a stored result without transcoding.
+        futures = [
+            dispatcher.submit(_job("feature-1", "https://cdn.example.com/feature.mov"))
+            for _ in range(15)
+        ]
+        for future in futures:
+            future.result(5)
+        self.assertTrue(dispatcher.wait_idle(5))
+
+        self.assertEqual(dispatcher.cost_model.estimate(feature), baseline)
+        metrics = dispatcher.metrics()
+        self.assertEqual(metrics["calibration"], {})
+        self.assertEqual(metrics["byClass"][JOB_CLASS_HEAVY]["completed"], 15)
+        self.assertEqual(metrics["byClass"][JOB_CLASS_HEAVY]["measured"], 0)
+
+    def test_packed_worker_child_finishes_pulled_jobs_before_recycling(self) -> None:
+        settings = _packing_settings(worker_max_jobs_per_child=3)
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        queue = InMemoryQueueClient(
+            queue=deque(
+                _job(f"job-{index}", "https://cdn.example.com/media/video.mp4")
+                for index in range(4)
+            )
+        )
+        callback = _RecordingCallbackClient()
+
+        exit_code = run_packed_worker_child(
+            settings,
+            callback,
+            lambda: queue,
+            LoadReporter(write_fd, slot=0),
+            build_dispatcher(settings, callback),
+        )
+
+        self.assertEqual(exit_code, EXIT_RECYCLE)
+        self.assertEqual(len(queue.queue), 1)
+        completed = [payload for payload in callback.payloads if payload["status"] == "completed"]
+        self.assertEqual(len(completed), 3)
+        reports = [json.loads(line) for line in os.read(read_fd, 65536).splitlines()]
+        self.assertEqual(reports[-1]["jobsProcessed"], 3)
+        self.assertGreater(reports[-1]["estimatedCpuSeconds"], 0)
+        self.assertIn("actualCpuSeconds", reports[-1])
+
+    def test_packed_worker_child_requeues_unstarted_jobs_on_stop(self) -> None:
+        runner = _GatedRunner()
+        dispatcher = self._dispatcher(runner)
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+
+        class _HandBackQueue(InMemoryQueueClient):
+            def requeue_job(self, queue_name: str, payload: dict[str, object]) -> None:
+                super().requeue_job(queue_name, payload)
+                runner.release_all()
+
+        queue = _HandBackQueue(
+            queue=deque(
+                _job(f"episode-{index}", "https://cdn.example.com/episode.mp4")
+                for index in range(1, 4)
+            )
+        )
+        stops = iter([False])
+
+        exit_code = run_packed_worker_child(
+            _packing_settings(),
+            _RecordingCallbackClient(),
+            lambda: queue,
+            LoadReporter(write_fd, slot=0),
+            dispatcher,
+            should_stop=lambda: next(stops, True),
+        )
+
+        self.assertEqual(exit_code, EXIT_RECYCLE)
+        self.assertEqual(runner.started, ["episode-1"])
+        self.assertEqual([job["jobId"] for job in queue.queue], ["episode-2", "episode-3"])
+        metrics = dispatcher.metrics()
+        self.assertEqual((metrics["completedTotal"], metrics["withdrawnTotal"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from collections.abc import Callable
+
+from app.api_callback import CallbackClient
+from app.artifact_uploader import MultipartUploader
+from app.main import process_single_media_job
+from app.media_pipeline import (
+    MediaPipelineError,
+    build_hls_proxy_command,
+    render_hls_playlist,
+    stream_proxy_segments,
+)
+from app.models import ProxyStreamProgress
+from app.settings import Settings
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self, on_status: Callable[[dict[str, object]], None] | None = None) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+        self.on_status = on_status
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+        if self.on_status is not None:
+            self.on_status(payload)
+
+
+class _InMemoryObjectStore:
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+
+    def object_url(self, key: str) -> str:
+        return f"https://media.example.com/{key}"
+
+    def put_object(self, key: str, data: bytes) -> str:
+        self.objects[key] = data
+        return hashlib.md5(data).hexdigest()
+
+    def create_multipart_upload(self, key: str) -> str:
+        raise NotImplementedError
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: list[object]) -> str:
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        raise NotImplementedError
+
+
+def _fake_hls_encoder(directory: str, durations: list[str], hold_after: int = 0) -> str:
+    """Writes segments and an atomically replaced playlist like `ffmpeg -f hls`.
+
+    After `hold_after` segments it waits (bounded) for a `continue` file, so tests
+    can look at what was uploaded while the encoder is still running.
+    """
+    path = os.path.join(directory, "ffmpeg")
+    script = f"""#!/bin/sh
+for last in "$@"; do :; done
+out=$(dirname "$last")
+printf init > "$out/init.mp4"
+printf '#EXTM3U\\n#EXT-X-MAP:URI="init.mp4"\\n' > "$out/playlist"
+i=0
+for duration in {" ".join(durations)}; do
+  if [ $i -eq {hold_after} ]; then
+    n=0
+    while [ ! -e "{directory}/continue" ] && [ $n -lt 200 ]; do sleep 0.05; n=$((n+1)); done
+  fi
+  name=$(printf 'segment-%05d.m4s' $i)
+  printf "segment-$i" > "$out/$name.tmp" && mv "$out/$name.tmp" "$out/$name"
+  printf '#EXTINF:%s,\\n%s\\n' "$duration" "$name" >> "$out/playlist"
+  cp "$out/playlist" "$out/index.m3u8.tmp" && mv "$out/index.m3u8.tmp" "$out/index.m3u8"
+  i=$((i+1))
+done
+"""
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(script)
+    os.chmod(path, 0o755)
+    return path
+
+
+class ProxyStreamingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = _InMemoryObjectStore()
+        self.uploader = MultipartUploader(self.store, retry_base_seconds=0)
+        self.settings = Settings(
+            media_worker_port=8101,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            media_jobs_queue="media-jobs",
+            callback_token="",
+            ffmpeg_binary_path=_fake_hls_encoder(
+                self.directory, ["4.000", "4.000", "2.000"], hold_after=2
+            ),
+            proxy_streaming=True,
+            proxy_segment_seconds=4,
+            proxy_partial_ready_segments=2,
+        )
+        self.payload = {
+            "jobId": "job-1",
+            "organizationId": "org-1",
+            "assetId": "asset-1",
+            "sourceUrl": "https://cdn.example.com/media/video.mp4",
+            "callbackPath": "/workers/media/status",
+        }
+
+    def _release_encoder(self) -> None:
+        with open(os.path.join(self.directory, "continue"), "w", encoding="utf-8"):
+            pass
+
+    def test_streaming_posts_partial_before_completed(self) -> None:
+        uploaded_at_partial: list[str] = []
+
+        def on_status(payload: dict[str, object]) -> None:
+            if payload["status"] == "partial":
+                uploaded_at_partial.extend(sorted(self.store.objects))
+                self._release_encoder()
+
+        callback = _RecordingCallbackClient(on_status)
+
+        result = process_single_media_job(
+            self.payload, self.settings, callback, uploader=self.uploader
+        )
+
+        statuses = [payload["status"] for payload in callback.payloads]
+        self.assertEqual(statuses, ["processing", "partial", "completed"])
+        partial = callback.payloads[1]
+        self.assertEqual(
+            partial["playlistUrl"], "https://media.example.com/proxy/org-1/asset-1/index.m3u8"
+        )
+        self.assertEqual(partial["segmentsReady"], 2)
+        self.assertEqual(
+            uploaded_at_partial,
+            [
+                "proxy/org-1/asset-1/index.m3u8",
+                "proxy/org-1/asset-1/init.mp4",
+                "proxy/org-1/asset-1/segment-00000.m4s",
+                "proxy/org-1/asset-1/segment-00001.m4s",
+            ],
+        )
+        self.assertEqual(result["proxyUrl"], partial["playlistUrl"])
+        self.assertEqual(result["playlistUrl"], partial["playlistUrl"])
+        self.assertEqual(self.store.objects["proxy/org-1/asset-1/segment-00002.m4s"], b"segment-2")
+
+    def test_streamed_playlist_grows_until_endlist(self) -> None:
+        progress: list[ProxyStreamProgress] = []
+        playlist_key = "proxy/org-1/asset-1/index.m3u8"
+
+        for item in stream_proxy_segments(
+            "https://cdn.example.com/media/video.mp4",
+            "proxy/org-1/asset-1",
+            {"durationSeconds": 10},
+            self.settings.ffmpeg_binary_path,
+            4,
+            self.uploader,
+            poll_interval_seconds=0.01,
+        ):
+            progress.append(item)
+            self.assertEqual(self.store.objects[playlist_key].decode("utf-8"), item.playlist)
+            if item.segments_ready >= 2:
+                self._release_encoder()
+
+        self.assertEqual(progress[-1].segments_ready, 3)
+        self.assertTrue(all(item.total_segments == 3 for item in progress))
+        self.assertNotIn("#EXT-X-ENDLIST", progress[-2].playlist)
+        self.assertIn("#EXT-X-ENDLIST", progress[-1].playlist)
+        self.assertIn("#EXTINF:2.000,", progress[-1].playlist)
+        self.assertTrue(progress[-1].complete)
+
+    def test_failed_encoder_fails_the_stream(self) -> None:
+        ffmpeg = os.path.join(self.directory, "ffmpeg")
+        with open(ffmpeg, "w", encoding="utf-8") as handle:
+            handle.write("#!/bin/sh\necho 'Invalid data found' >&2\nexit 1\n")
+
+        with self.assertRaises(MediaPipelineError) as raised:
+            list(
+                stream_proxy_segments(
+                    "https://cdn.example.com/media/video.mp4",
+                    "proxy/org-1/asset-1",
+                    {"durationSeconds": 10},
+                    ffmpeg,
+                    4,
+                    self.uploader,
+                    poll_interval_seconds=0.01,
+                )
+            )
+
+        self.assertIn("Invalid data found", str(raised.exception))
+        self.assertEqual(self.store.objects, {})
+
+    def test_render_hls_playlist_uses_fmp4_init_segment(self) -> None:
+        playlist = render_hls_playlist([4.0, 4.0], 4, complete=False)
+
+        self.assertIn('#EXT-X-MAP:URI="init.mp4"', playlist)
+        self.assertIn("#EXT-X-PLAYLIST-TYPE:EVENT", playlist)
+        self.assertIn("segment-00001.m4s", playlist)
+
+    def test_build_hls_proxy_command_writes_event_fmp4_segments(self) -> None:
+        command = build_hls_proxy_command("ffmpeg", "https://cdn/video.mp4", "/tmp/out", 4)
+
+        self.assertEqual(command[0], "ffmpeg")
+        self.assertIn("fmp4", command)
+        self.assertIn("event", command)
+        self.assertEqual(command[-1], "/tmp/out/index.m3u8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+from .models import PricingJob, PricingRecommendation
+from .pricing_engine import PricingEngineError
+
+logger = logging.getLogger(__name__)
+
+BatchEvaluator = Callable[[list[PricingJob]], list[PricingRecommendation | PricingEngineError]]
+
+_PendingRequest = tuple[PricingJob, "Future[PricingRecommendation]"]
+
+
+class RecommendationBatcher:
+    def __init__(
+        self,
+        evaluate: BatchEvaluator,
+        max_batch_size: int = 64,
+        max_wait_seconds: float = 0.002,
+    ):
+        self.evaluate = evaluate
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_seconds)
+        self.batches_total = 0
+        self.requests_total = 0
+        self.largest_batch = 0
+        self._queue: queue.SimpleQueue[_PendingRequest | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, job: PricingJob) -> Future[PricingRecommendation]:
+        self._ensure_started()
+        future: Future[PricingRecommendation] = Future()
+        self._queue.put((job, future))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pricing-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self, first: _PendingRequest) -> tuple[list[_PendingRequest], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stopping = self._collect(first)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: list[_PendingRequest]) -> None:
+        self.batches_total += 1
+        self.requests_total += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        try:
+            outcomes = self.evaluate([job for job, _ in batch])
+        except Exception as error:  # noqa: BLE001 - fail the whole batch, keep the loop alive
+            logger.exception("Pricing batch evaluation failed")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, PricingEngineError):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "batchesTotal": self.batches_total,
+            "requestsTotal": self.requests_total,
+            "largestBatch": self.largest_batch,
+            "averageBatchSize": (
+                round(self.requests_total / self.batches_total, 3) if self.batches_total else 0.0
+            ),
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import heapq
+import json
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+
+class IdempotencyStorePort(Protocol):
+    def get(self, key: str) -> dict[str, Any] | None: ...
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None: ...
+
+
+class InMemoryIdempotencyStore(IdempotencyStorePort):
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._values: dict[str, tuple[float, dict[str, Any]]] = {}
+        # Expiry order of stored values, so keys that are never read again are still evicted.
+        self._expiries: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._values[key]
+                return None
+            return value
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None:
+        with self._lock:
+            now = self._clock()
+            self._evict_expired_locked(now)
+            expires_at = now + ttl_seconds
+            self._values[key] = (expires_at, value)
+            heapq.heappush(self._expiries, (expires_at, key))
+
+    def _evict_expired_locked(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiries)
+            entry = self._values.get(key)
+            # A key written again since has a later expiry of its own.
+            if entry is not None and entry[0] == expires_at:
+                del self._values[key]
+
+
+class RedisIdempotencyStore(IdempotencyStorePort):
+    def __init__(self, redis_url: str, namespace: str, client: Any | None = None):
+        if client is None:
+            try:
+                import redis  # type: ignore[import-not-found]
+            except ImportError as error:  # pragma: no cover
+                raise RuntimeError("redis package is required for RedisIdempotencyStore") from error
+            client = redis.from_url(redis_url)
+
+        self._redis = client
+        self._namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self._namespace}:{key}"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        raw = self._redis.get(self._key(key))
+        if raw is None:
+            return None
+
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+
+        value = json.loads(raw)
+        if isinstance(value, dict):
+            return value
+        return None
+
+    def put(self, key: str, value: dict[str, Any], ttl_seconds: float) -> None:
+        self._redis.set(self._key(key), json.dumps(value), px=max(1, int(ttl_seconds * 1000)))
+
+
+class JobDeduplicator:
+    # Pricing jobs finish in microseconds, so only completed results are shared;
+    # collapsing in-flight evaluations would cost more than running them.
+    def __init__(self, store: IdempotencyStorePort, result_ttl_seconds: float = 86400.0):
+        self.store = store
+        self.result_ttl_seconds = result_ttl_seconds
+
+    def completed_result(self, job_id: str) -> dict[str, Any] | None:
+        return self.store.get(f"job:{job_id}")
+
+    def record_completed(self, job_id: str, payload: dict[str, Any]) -> None:
+        self.store.put(f"job:{job_id}", payload, self.result_ttl_seconds)
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 from collections.abc import Callable
 from typing import Any
 
 try:
-    from fastapi import FastAPI  # type: ignore[import-not-found]
+    from fastapi import FastAPI, HTTPException  # type: ignore[import-not-found]
 except ImportError:  # pragma: no cover
 
     class FastAPI:  # type: ignore[no-redef]
@@ -18,30 +19,86 @@ except ImportError:  # pragma: no cover
 
             return decorator
 
+        def post(self, _path: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+            return self.get(_path)
+
+    class HTTPException(Exception):  # type: ignore[no-redef]
+        def __init__(self, status_code: int, detail: Any = None):
+            super().__init__(detail)
+            self.status_code = status_code
+            self.detail = detail
+
 
 from .api_callback import CallbackClient
+from .batching import RecommendationBatcher
+from .idempotency import InMemoryIdempotencyStore, JobDeduplicator, RedisIdempotencyStore
 from .models import PricingJob, utc_now_iso
-from .pricing_engine import PricingEngineError, recommend_price
+from .pricing_engine import PricingEngineError, recommend_price, recommend_prices
 from .queue_consumer import QueueClientPort, RedisQueueClient
 from .settings import Settings, load_settings
 
 app = FastAPI(title="StudioOS Pricing Worker", version="0.1.0")
 
 
+_batcher: RecommendationBatcher | None = None
+_batching_configured: bool | None = None
+
+
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+def get_batcher() -> RecommendationBatcher | None:
+    # Evaluating one request takes tens of microseconds, less than the thread
+    # hop into a batch, so batching is opt-in via a positive wait window.
+    global _batcher, _batching_configured
+    if _batching_configured is None:
+        settings = load_settings()
+        _batching_configured = settings.recommend_batch_max_wait_ms > 0
+        if _batching_configured:
+            _batcher = RecommendationBatcher(
+                recommend_prices,
+                max_batch_size=settings.recommend_batch_max_size,
+                max_wait_seconds=settings.recommend_batch_max_wait_ms / 1000.0,
+            )
+    return _batcher
+
+
+@app.post("/recommend")
+async def recommend(payload: dict[str, Any]) -> dict[str, Any]:
+    try:
+        job = PricingJob.from_payload(payload)
+    except (TypeError, ValueError, OverflowError) as error:
+        # OverflowError covers non-finite numbers such as 1e400 in baseDailyRateCents.
+        raise HTTPException(status_code=422, detail="Invalid pricing payload") from error
+
+    try:
+        batcher = get_batcher()
+        if batcher is None:
+            recommendation = recommend_price(job)
+        else:
+            recommendation = await asyncio.wrap_future(batcher.submit(job))
+    except PricingEngineError as error:
+        raise HTTPException(status_code=422, detail=str(error)) from error
+    return recommendation.to_dict()
+
+
 def process_single_pricing_job(
     payload: dict[str, Any],
     callback_client: CallbackClient,
+    deduplicator: JobDeduplicator | None = None,
 ) -> dict[str, Any]:
     job = PricingJob.from_payload(payload)
 
     if not job.job_id or not job.organization_id:
         raise ValueError("Invalid pricing job payload")
 
+    if deduplicator is not None:
+        completed = deduplicator.completed_result(job.job_id)
+        if completed is not None:
+            return completed
+
     callback_client.post_status(
         job.callback_path,
         {
@@ -78,6 +135,8 @@ def process_single_pricing_job(
     }
 
     callback_client.post_status(job.callback_path, completion_payload)
+    if deduplicator is not None:
+        deduplicator.record_completed(job.job_id, completion_payload)
     return completion_payload
 
 
@@ -85,19 +144,35 @@ def run_consumer_iteration(
     queue_client: QueueClientPort,
     settings: Settings,
     callback_client: CallbackClient,
+    deduplicator: JobDeduplicator | None = None,
 ) -> dict[str, Any] | None:
     payload = queue_client.pop_job(settings.pricing_jobs_queue)
     if payload is None:
         return None
 
-    return process_single_pricing_job(payload, callback_client)
+    return process_single_pricing_job(payload, callback_client, deduplicator)
 
 
-def build_runtime() -> tuple[Settings, QueueClientPort, CallbackClient]:
-    settings = load_settings()
-    queue_client = RedisQueueClient(settings.redis_url)
-    callback_client = CallbackClient(
+def build_callback_client(settings: Settings) -> CallbackClient:
+    return CallbackClient(
         base_url=settings.api_base_url,
         callback_token=settings.callback_token,
     )
+
+
+def build_deduplicator(settings: Settings) -> JobDeduplicator:
+    if settings.idempotency_backend == "redis":
+        return JobDeduplicator(
+            RedisIdempotencyStore(settings.redis_url, namespace="pricing-worker:idempotency"),
+            result_ttl_seconds=settings.idempotency_ttl_seconds,
+        )
+    return JobDeduplicator(
+        InMemoryIdempotencyStore(), result_ttl_seconds=settings.idempotency_ttl_seconds
+    )
+
+
+def build_runtime() -> tuple[Settings, QueueClientPort, CallbackClient]:
+    settings = load_settings()
+    queue_client = RedisQueueClient(settings.redis_url)
+    callback_client = build_callback_client(settings)
     return settings, queue_client, callback_client
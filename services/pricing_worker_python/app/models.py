@@ -35,6 +35,13 @@ class PricingRecommendation:
     confidence: float
     explanation: str
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "suggestedDailyRateCents": self.suggested_daily_rate_cents,
+            "confidence": self.confidence,
+            "explanation": self.explanation,
+        }
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
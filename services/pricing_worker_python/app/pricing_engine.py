@@ -67,3 +67,17 @@ def recommend_price(job: PricingJob) -> PricingRecommendation:
         confidence=confidence,
         explanation=explanation,
     )
+
+
+def recommend_prices(
+    jobs: list[PricingJob],
+) -> list[PricingRecommendation | PricingEngineError]:
+    # Per-job failures are returned in place so one bad request in a batch
+    # does not fail the others.
+    outcomes: list[PricingRecommendation | PricingEngineError] = []
+    for job in jobs:
+        try:
+            outcomes.append(recommend_price(job))
+        except PricingEngineError as error:
+            outcomes.append(error)
+    return outcomes
@@ -9,6 +9,13 @@ class Settings:
     redis_url: str
     pricing_jobs_queue: str
     callback_token: str
+    worker_processes: int = 1
+    worker_max_jobs_per_child: int = 0
+    worker_max_rss_mb: int = 0
+    idempotency_backend: str = "memory"
+    idempotency_ttl_seconds: int = 86400
+    recommend_batch_max_size: int = 64
+    recommend_batch_max_wait_ms: float = 0.0
 
 
 def load_settings() -> Settings:
@@ -18,4 +25,13 @@ def load_settings() -> Settings:
         redis_url=os.getenv("REDIS_URL", "redis://localhost:6379"),
         pricing_jobs_queue=os.getenv("PRICING_JOBS_QUEUE", "pricing-jobs"),
         callback_token=os.getenv("PRICING_WORKER_CALLBACK_TOKEN", ""),
+        worker_processes=int(os.getenv("PRICING_WORKER_PROCESSES", "1")),
+        worker_max_jobs_per_child=int(os.getenv("PRICING_WORKER_MAX_JOBS_PER_CHILD", "0")),
+        worker_max_rss_mb=int(os.getenv("PRICING_WORKER_MAX_RSS_MB", "0")),
+        idempotency_backend=os.getenv("PRICING_WORKER_IDEMPOTENCY_BACKEND", "memory"),
+        idempotency_ttl_seconds=int(os.getenv("PRICING_WORKER_IDEMPOTENCY_TTL_SECONDS", "86400")),
+        recommend_batch_max_size=int(os.getenv("PRICING_WORKER_RECOMMEND_BATCH_MAX_SIZE", "64")),
+        recommend_batch_max_wait_ms=float(
+            os.getenv("PRICING_WORKER_RECOMMEND_BATCH_MAX_WAIT_MS", "0")
+        ),
     )
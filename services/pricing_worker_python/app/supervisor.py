@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import os
+import resource
+import select
+import signal
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from .api_callback import CallbackClient
+from .idempotency import JobDeduplicator
+from .main import build_callback_client, build_deduplicator, run_consumer_iteration
+from .pricing_engine import PricingEngineError
+from .queue_consumer import QueueClientPort, RedisQueueClient
+from .settings import Settings, load_settings
+
+logger = logging.getLogger(__name__)
+
+EXIT_RECYCLE = 0
+EXIT_CRASH = 1
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is the peak (KiB on Linux), which is still a safe recycle signal.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadReporter:
+    def __init__(self, write_fd: int, slot: int):
+        self._write_fd = write_fd
+        self.slot = slot
+
+    def report(self, **fields: Any) -> None:
+        line = json.dumps({"slot": self.slot, "pid": os.getpid(), **fields}) + "\n"
+        try:
+            os.write(self._write_fd, line.encode("utf-8"))
+        except OSError:
+            # The supervisor is gone; the child will be reaped with it.
+            return
+
+
+@dataclass
+class ChildState:
+    slot: int
+    pid: int
+    read_fd: int
+    started_at: float
+    jobs_processed: int = 0
+    busy_seconds: float = 0.0
+    rss_bytes: int = 0
+    buffer: bytes = b""
+
+
+@dataclass
+class SlotCounters:
+    crashes: int = 0
+    recycles: int = 0
+
+
+class WorkerSupervisor:
+    def __init__(
+        self,
+        child_main: Callable[[LoadReporter], int],
+        worker_count: int,
+        restart_backoff_seconds: float = 1.0,
+    ):
+        self.child_main = child_main
+        self.worker_count = worker_count
+        self.restart_backoff_seconds = restart_backoff_seconds
+        self.children: dict[int, ChildState] = {}
+        self.counters: dict[int, SlotCounters] = {}
+        # Crashed slots wait here for their backoff so one crash loop never
+        # stalls report draining or restarts of the other slots.
+        self.restart_at: dict[int, float] = {}
+        self._stopping = False
+
+    def start(self) -> None:
+        for slot in range(self.worker_count):
+            self.counters.setdefault(slot, SlotCounters())
+            self._spawn(slot)
+
+    def _spawn(self, slot: int) -> None:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - runs in the forked child
+            os.close(read_fd)
+            for state in self.children.values():
+                os.close(state.read_fd)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            exit_code = EXIT_CRASH
+            try:
+                exit_code = self.child_main(LoadReporter(write_fd, slot))
+            except BaseException:
+                logger.exception("Worker child in slot %s crashed", slot)
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        self.children[pid] = ChildState(
+            slot=slot, pid=pid, read_fd=read_fd, started_at=time.monotonic()
+        )
+
+    def poll(self, timeout: float = 0.0) -> None:
+        if self.restart_at:
+            timeout = min(timeout, max(0.0, min(self.restart_at.values()) - time.monotonic()))
+        self._drain_reports(timeout)
+        self._reap()
+        self._restart_due()
+
+    def _restart_due(self) -> None:
+        now = time.monotonic()
+        for slot, restart_at in sorted(self.restart_at.items()):
+            if restart_at <= now and not self._stopping:
+                del self.restart_at[slot]
+                self._spawn(slot)
+
+    def _drain_reports(self, timeout: float) -> None:
+        by_fd = {state.read_fd: state for state in self.children.values()}
+        if not by_fd:
+            if self.restart_at and timeout > 0:
+                time.sleep(timeout)
+            return
+
+        readable, _, _ = select.select(list(by_fd), [], [], timeout)
+        for read_fd in readable:
+            state = by_fd[read_fd]
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                continue
+            state.buffer += chunk
+            *lines, state.buffer = state.buffer.split(b"\n")
+            for line in lines:
+                self._apply_report(state, line)
+
+    @staticmethod
+    def _apply_report(state: ChildState, line: bytes) -> None:
+        try:
+            report = json.loads(line)
+        except ValueError:
+            return
+
+        state.jobs_processed = int(report.get("jobsProcessed", state.jobs_processed))
+        state.busy_seconds = float(report.get("busySeconds", state.busy_seconds))
+        state.rss_bytes = int(report.get("rssBytes", state.rss_bytes))
+
+    def _reap(self) -> None:
+        for pid in list(self.children):
+            try:
+                waited_pid, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                waited_pid, status = pid, 0
+            if waited_pid == 0:
+                continue
+
+            state = self.children.pop(pid)
+            os.close(state.read_fd)
+            counters = self.counters[state.slot]
+            recycled = os.WIFEXITED(status) and os.WEXITSTATUS(status) == EXIT_RECYCLE
+            if recycled:
+                counters.recycles += 1
+            else:
+                counters.crashes += 1
+                logger.warning("Worker child %s in slot %s exited with %s", pid, state.slot, status)
+
+            if self._stopping:
+                continue
+            if not recycled and self.restart_backoff_seconds > 0:
+                self.restart_at[state.slot] = time.monotonic() + self.restart_backoff_seconds
+                continue
+            self._spawn(state.slot)
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        stats: list[dict[str, Any]] = []
+        for state in sorted(self.children.values(), key=lambda state: state.slot):
+            uptime = max(now - state.started_at, 1e-9)
+            stats.append(
+                {
+                    "slot": state.slot,
+                    "pid": state.pid,
+                    "jobsProcessed": state.jobs_processed,
+                    "utilization": round(min(state.busy_seconds / uptime, 1.0), 3),
+                    "rssBytes": state.rss_bytes,
+                    "uptimeSeconds": round(uptime, 3),
+                    "crashes": self.counters[state.slot].crashes,
+                    "recycles": self.counters[state.slot].recycles,
+                }
+            )
+        return stats
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stopping = True
+        self.restart_at.clear()
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                continue
+
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            self.poll(timeout=0.05)
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self.poll(timeout=0.05)
+
+    def run_forever(self, report_interval_seconds: float = 30.0) -> None:
+        def _handle_stop(_signum: int, _frame: object) -> None:
+            self._stopping = True
+
+        signal.signal(signal.SIGTERM, _handle_stop)
+        signal.signal(signal.SIGINT, _handle_stop)
+
+        self.start()
+        next_report = time.monotonic() + report_interval_seconds
+        while not self._stopping:
+            self.poll(timeout=1.0)
+            if time.monotonic() >= next_report:
+                logger.info("Worker children: %s", json.dumps(self.stats()))
+                next_report = time.monotonic() + report_interval_seconds
+        self.stop()
+
+
+def run_worker_child(
+    settings: Settings,
+    callback_client: CallbackClient,
+    queue_client_factory: Callable[[], QueueClientPort],
+    reporter: LoadReporter,
+    idle_sleep_seconds: float = 0.5,
+    should_stop: Callable[[], bool] = lambda: False,
+    deduplicator: JobDeduplicator | None = None,
+) -> int:
+    # Connections are opened after fork so children never share sockets.
+    queue_client = queue_client_factory()
+    max_jobs = settings.worker_max_jobs_per_child
+    max_rss_bytes = settings.worker_max_rss_mb * 1024 * 1024
+    jobs_processed = 0
+    busy_seconds = 0.0
+
+    while not should_stop():
+        started = time.monotonic()
+        try:
+            result = run_consumer_iteration(queue_client, settings, callback_client, deduplicator)
+        except (ValueError, PricingEngineError):
+            # Failure callbacks were already posted; the job is done from the worker's view.
+            result = {}
+
+        rss_bytes = current_rss_bytes()
+        if result is not None:
+            jobs_processed += 1
+            busy_seconds += time.monotonic() - started
+        reporter.report(
+            jobsProcessed=jobs_processed,
+            busySeconds=round(busy_seconds, 6),
+            rssBytes=rss_bytes,
+        )
+
+        if max_jobs and jobs_processed >= max_jobs:
+            return EXIT_RECYCLE
+        if max_rss_bytes and rss_bytes >= max_rss_bytes:
+            return EXIT_RECYCLE
+        if result is None:
+            time.sleep(idle_sleep_seconds)
+
+    return EXIT_RECYCLE
+
+
+def warm_runtime() -> tuple[Settings, CallbackClient]:
+    settings = load_settings()
+    callback_client = build_callback_client(settings)
+
+    try:
+        # RedisQueueClient imports redis lazily; doing it here keeps the module
+        # in the shared pages instead of one private copy per child.
+        import redis  # type: ignore[import-not-found]  # noqa: F401
+    except ImportError:  # pragma: no cover
+        pass
+
+    # Move everything imported so far into the permanent generation so child
+    # collections do not touch (and copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+    return settings, callback_client
+
+
+def build_supervisor() -> WorkerSupervisor:
+    settings, callback_client = warm_runtime()
+    stop_requested = False
+
+    def _request_stop(_signum: int, _frame: object) -> None:
+        nonlocal stop_requested
+        stop_requested = True
+
+    def child_main(reporter: LoadReporter) -> int:
+        signal.signal(signal.SIGTERM, _request_stop)
+        return run_worker_child(
+            settings,
+            callback_client,
+            lambda: RedisQueueClient(settings.redis_url),
+            reporter,
+            should_stop=lambda: stop_requested,
+            deduplicator=build_deduplicator(settings),
+        )
+
+    return WorkerSupervisor(child_main=child_main, worker_count=settings.worker_processes)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    logging.basicConfig(level=logging.INFO)
+    build_supervisor().run_forever()
@@ -0,0 +1,144 @@
+import time
+import unittest
+
+from app.api_callback import CallbackClient
+from app.idempotency import (
+    InMemoryIdempotencyStore,
+    JobDeduplicator,
+    RedisIdempotencyStore,
+)
+from app.main import process_single_pricing_job
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeRedis:
+    """Just enough of redis-py for the idempotency store: SET PX and GET."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self.clock = clock
+        self.values: dict[str, tuple[bytes, float | None]] = {}
+        self.set_calls: list[dict[str, object]] = []
+
+    def _live(self, key: str) -> bytes | None:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.clock():
+            del self.values[key]
+            return None
+        return value
+
+    def get(self, key: str) -> bytes | None:
+        return self._live(key)
+
+    def set(self, key: str, value: str, nx: bool = False, px: int | None = None) -> bool | None:
+        self.set_calls.append({"key": key, "nx": nx, "px": px})
+        if nx and self._live(key) is not None:
+            return None
+        expires_at = self.clock() + px / 1000 if px is not None else None
+        self.values[key] = (value.encode("utf-8"), expires_at)
+        return True
+
+
+class IdempotencyTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.payload = {
+            "jobId": "price-1",
+            "organizationId": "org-1",
+            "category": "camera",
+            "seasonality": "high",
+            "baseDailyRateCents": 10000,
+            "utilizationHistory": [0.3, 0.5, 0.7, 0.8],
+            "callbackPath": "/workers/pricing/status",
+        }
+
+    def test_duplicate_job_id_returns_stored_result_without_callbacks(self) -> None:
+        deduplicator = JobDeduplicator(InMemoryIdempotencyStore())
+        callback = _RecordingCallbackClient()
+
+        first = process_single_pricing_job(self.payload, callback, deduplicator)
+        second = process_single_pricing_job(self.payload, callback, deduplicator)
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(callback.payloads), 2)
+
+    def test_completed_results_expire_after_ttl(self) -> None:
+        clock = _FakeClock()
+        deduplicator = JobDeduplicator(
+            InMemoryIdempotencyStore(clock=clock), result_ttl_seconds=10
+        )
+        callback = _RecordingCallbackClient()
+
+        process_single_pricing_job(self.payload, callback, deduplicator)
+        clock.now = 11.0
+        process_single_pricing_job(self.payload, callback, deduplicator)
+
+        self.assertEqual(len(callback.payloads), 4)
+
+    def test_expired_entries_are_evicted_without_being_read_again(self) -> None:
+        clock = _FakeClock()
+        store = InMemoryIdempotencyStore(clock=clock)
+        for index in range(100):
+            store.put(f"job:{index}", {"index": index}, ttl_seconds=10)
+        store.put("job:0", {"index": 0}, ttl_seconds=30)
+
+        clock.now = 11.0
+        store.put("job:fresh", {"index": 100}, ttl_seconds=10)
+
+        self.assertEqual(sorted(store._values), ["job:0", "job:fresh"])
+        self.assertEqual(store.get("job:0"), {"index": 0})
+
+    def test_jobs_only_store_their_completed_result(self) -> None:
+        redis = _FakeRedis()
+        store = RedisIdempotencyStore(
+            "redis://localhost:6379", namespace="pricing-worker:idempotency", client=redis
+        )
+        callback = _RecordingCallbackClient()
+
+        process_single_pricing_job(self.payload, callback, JobDeduplicator(store))
+
+        self.assertEqual(
+            [call["key"] for call in redis.set_calls], ["pricing-worker:idempotency:job:price-1"]
+        )
+
+
+class RedisIdempotencyStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = _FakeClock()
+        self.redis = _FakeRedis(self.clock)
+        self.store = RedisIdempotencyStore(
+            "redis://localhost:6379", namespace="pricing-worker:idempotency", client=self.redis
+        )
+
+    def test_put_and_get_round_trip_with_ttl(self) -> None:
+        self.store.put("job:job-1", {"status": "completed"}, ttl_seconds=10)
+
+        self.assertEqual(self.store.get("job:job-1"), {"status": "completed"})
+        self.assertEqual(
+            self.redis.set_calls[-1],
+            {"key": "pricing-worker:idempotency:job:job-1", "nx": False, "px": 10000},
+        )
+        self.clock.now = 10.0
+        self.assertIsNone(self.store.get("job:job-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import unittest
+from concurrent.futures import wait
+from unittest import mock
+
+from app import main
+from app.batching import RecommendationBatcher
+from app.main import HTTPException, get_batcher, recommend
+from app.models import PricingJob
+from app.pricing_engine import PricingEngineError, recommend_price, recommend_prices
+
+
+def _payload(base_daily_rate_cents: int = 10000, category: str = "camera") -> dict:
+    return {
+        "organizationId": "org-1",
+        "category": category,
+        "seasonality": "high",
+        "baseDailyRateCents": base_daily_rate_cents,
+        "utilizationHistory": [0.3, 0.5, 0.7, 0.8],
+    }
+
+
+class RecommendEndpointTests(unittest.TestCase):
+    def test_recommend_returns_recommendation_directly(self) -> None:
+        result = asyncio.run(recommend(_payload()))
+
+        self.assertEqual(result["suggestedDailyRateCents"], 12096)
+        self.assertEqual(result["confidence"], 0.64)
+        self.assertIn("utilization", result["explanation"])
+
+    def test_recommend_rejects_invalid_pricing_input(self) -> None:
+        with self.assertRaises(HTTPException) as context:
+            asyncio.run(recommend(_payload(base_daily_rate_cents=0)))
+
+        self.assertEqual(context.exception.status_code, 422)
+
+    def test_recommend_rejects_non_finite_numbers(self) -> None:
+        for rate in (float("inf"), float("nan")):
+            with self.assertRaises(HTTPException) as context:
+                asyncio.run(recommend({**_payload(), "baseDailyRateCents": rate}))
+
+            self.assertEqual(context.exception.status_code, 422)
+
+    def _reset_batcher(self) -> None:
+        if main._batcher is not None:
+            main._batcher.close()
+        main._batcher = None
+        main._batching_configured = None
+
+    def test_requests_are_evaluated_inline_by_default(self) -> None:
+        self._reset_batcher()
+        self.addCleanup(self._reset_batcher)
+
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("PRICING_WORKER_RECOMMEND_BATCH_MAX_WAIT_MS", None)
+            result = asyncio.run(recommend(_payload()))
+
+        self.assertEqual(result["suggestedDailyRateCents"], 12096)
+        self.assertIsNone(get_batcher())
+
+    def test_positive_wait_window_enables_batching(self) -> None:
+        self._reset_batcher()
+        self.addCleanup(self._reset_batcher)
+
+        with mock.patch.dict(os.environ, {"PRICING_WORKER_RECOMMEND_BATCH_MAX_WAIT_MS": "1"}):
+            result = asyncio.run(recommend(_payload()))
+
+        self.assertEqual(result["suggestedDailyRateCents"], 12096)
+        batcher = get_batcher()
+        self.assertIsNotNone(batcher)
+        self.assertEqual(batcher.stats()["requestsTotal"], 1)
+
+    def test_concurrent_requests_within_window_share_a_batch(self) -> None:
+        batcher = RecommendationBatcher(recommend_prices, max_batch_size=4, max_wait_seconds=0.2)
+        self.addCleanup(batcher.close)
+
+        futures = [batcher.submit(PricingJob.from_payload(_payload())) for _ in range(10)]
+        wait(futures, timeout=5)
+
+        rates = {future.result().suggested_daily_rate_cents for future in futures}
+        self.assertEqual(rates, {12096})
+        self.assertEqual(batcher.stats()["requestsTotal"], 10)
+        self.assertEqual(batcher.stats()["largestBatch"], 4)
+        self.assertLess(batcher.stats()["batchesTotal"], 10)
+
+    def test_failures_are_isolated_to_their_request(self) -> None:
+        batcher = RecommendationBatcher(recommend_prices, max_wait_seconds=0.05)
+        self.addCleanup(batcher.close)
+
+        ok = batcher.submit(PricingJob.from_payload(_payload()))
+        bad = batcher.submit(PricingJob.from_payload(_payload(base_daily_rate_cents=0)))
+
+        self.assertEqual(ok.result(timeout=5).suggested_daily_rate_cents, 12096)
+        self.assertIsInstance(bad.exception(timeout=5), PricingEngineError)
+
+    def test_batch_evaluation_matches_single_evaluation(self) -> None:
+        jobs = [
+            PricingJob.from_payload(_payload(base_daily_rate_cents=rate, category=category))
+            for rate in (4500, 10000, 25000)
+            for category in ("camera", "lens", "drone", "unknown")
+        ]
+
+        self.assertEqual(recommend_prices(jobs), [recommend_price(job) for job in jobs])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+import unittest
+from collections import deque
+
+from app.api_callback import CallbackClient
+from app.queue_consumer import InMemoryQueueClient
+from app.settings import Settings
+from app.supervisor import (
+    EXIT_CRASH,
+    EXIT_RECYCLE,
+    LoadReporter,
+    WorkerSupervisor,
+    run_worker_child,
+)
+
+
+class _RecordingCallbackClient(CallbackClient):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://localhost:3000")
+        self.payloads: list[dict[str, object]] = []
+
+    def post_status(self, callback_path: str, payload: dict[str, object]) -> None:
+        _ = callback_path
+        self.payloads.append(payload)
+
+
+def _job(index: int, base_daily_rate_cents: int = 10000) -> dict:
+    return {
+        "jobId": f"price-{index}",
+        "organizationId": "org-1",
+        "category": "camera",
+        "seasonality": "normal",
+        "baseDailyRateCents": base_daily_rate_cents,
+        "utilizationHistory": [0.4, 0.5],
+        "callbackPath": "/workers/pricing/status",
+    }
+
+
+def _wait_for(supervisor: WorkerSupervisor, predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        supervisor.poll(timeout=0.05)
+        if predicate():
+            return True
+    return False
+
+
+class SupervisorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.settings = Settings(
+            pricing_worker_port=8102,
+            api_base_url="http://localhost:3000",
+            redis_url="redis://localhost:6379",
+            pricing_jobs_queue="pricing-jobs",
+            callback_token="",
+            worker_processes=2,
+            worker_max_jobs_per_child=2,
+            worker_max_rss_mb=0,
+        )
+
+    def test_run_worker_child_recycles_after_max_jobs(self) -> None:
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        queue = InMemoryQueueClient(
+            queue=deque([_job(1), _job(2, base_daily_rate_cents=0), _job(3)])
+        )
+        callback = _RecordingCallbackClient()
+
+        exit_code = run_worker_child(
+            self.settings, callback, lambda: queue, LoadReporter(write_fd, slot=0)
+        )
+
+        self.assertEqual(exit_code, EXIT_RECYCLE)
+        self.assertEqual(len(queue.queue), 1)
+        self.assertEqual([payload["status"] for payload in callback.payloads][-1], "failed")
+        reports = [json.loads(line) for line in os.read(read_fd, 65536).splitlines()]
+        self.assertEqual(reports[-1]["jobsProcessed"], 2)
+
+    def test_supervisor_collects_per_child_load(self) -> None:
+        def child_main(reporter: LoadReporter) -> int:
+            reporter.report(jobsProcessed=3, busySeconds=0.0, rssBytes=1024)
+            time.sleep(30)
+            return EXIT_RECYCLE
+
+        supervisor = WorkerSupervisor(child_main=child_main, worker_count=2)
+        supervisor.start()
+        self.addCleanup(supervisor.stop, 1.0)
+
+        collected = _wait_for(
+            supervisor,
+            lambda: [child["jobsProcessed"] for child in supervisor.stats()] == [3, 3],
+        )
+
+        self.assertTrue(collected)
+        self.assertEqual([child["slot"] for child in supervisor.stats()], [0, 1])
+        self.assertEqual(supervisor.stats()[0]["rssBytes"], 1024)
+
+    def test_supervisor_restarts_crashed_children(self) -> None:
+        supervisor = WorkerSupervisor(
+            child_main=lambda _reporter: EXIT_CRASH,
+            worker_count=1,
+            restart_backoff_seconds=0.0,
+        )
+        supervisor.start()
+        self.addCleanup(supervisor.stop, 1.0)
+
+        restarted = _wait_for(supervisor, lambda: supervisor.counters[0].crashes >= 2)
+
+        self.assertTrue(restarted)
+        self.assertEqual(len(supervisor.children), 1)
+
+    def test_crash_backoff_does_not_stall_other_slots(self) -> None:
+        def child_main(reporter: LoadReporter) -> int:
+            if reporter.slot == 0:
+                return EXIT_CRASH
+            reporter.report(jobsProcessed=1, busySeconds=0.0, rssBytes=1024)
+            time.sleep(30)
+            return EXIT_RECYCLE
+
+        supervisor = WorkerSupervisor(
+            child_main=child_main, worker_count=2, restart_backoff_seconds=30.0
+        )
+        supervisor.start()
+        self.addCleanup(supervisor.stop, 1.0)
+        started = time.monotonic()
+
+        collected = _wait_for(
+            supervisor,
+            lambda: supervisor.counters[0].crashes == 1
+            and [child["jobsProcessed"] for child in supervisor.stats()] == [1],
+        )
+
+        self.assertTrue(collected)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertIn(0, supervisor.restart_at)
+        self.assertEqual([child["slot"] for child in supervisor.stats()], [1])
+
+    def test_crashed_slot_is_respawned_after_backoff(self) -> None:
+        supervisor = WorkerSupervisor(
+            child_main=lambda _reporter: EXIT_CRASH,
+            worker_count=1,
+            restart_backoff_seconds=0.2,
+        )
+        supervisor.start()
+        self.addCleanup(supervisor.stop, 1.0)
+
+        restarted = _wait_for(supervisor, lambda: supervisor.counters[0].crashes >= 2)
+
+        self.assertTrue(restarted)
+
+
+if __name__ == "__main__":
+    unittest.main()